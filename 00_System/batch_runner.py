@@ -2,8 +2,15 @@
 """
 Daily batch runner for Brain Content System.
 
-- Reads a theme list (CSV/TSV/line-delimited) and runs master_generator.py per theme.
+- Reads a theme list (CSV/TSV/line-delimited) and runs master_generator.py per theme
+  (one subprocess per theme, or --in-process to share imports and API clients).
 - Forces prefer_gemini_for_text=True so Claude残高ゼロでも動作。
+- Runs up to --concurrency themes in parallel; Claude/Gemini rate limits are split across workers.
+- Runs the Phase 2 YouTube search + transcript fetch once per distinct keyword
+  before the themes start, and hands the result to every theme's Phase 2.
+- With --batch-api, collects each of Phase 1-4's LLM requests across all themes and
+  sends them as one Message Batch (Anthropic) / Batch Mode job (Gemini) per stage;
+  the normal per-theme run then uses those results instead of interactive calls.
 - Sends LINE Notify if LINE_NOTIFY_TOKEN is set (start / each item / summary).
 
 Usage example:
@@ -18,9 +25,11 @@ import argparse
 import csv
 import json
 import os
+import contextvars
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import List
@@ -79,17 +88,232 @@ def load_theme_list(path: Path) -> List[str]:
     return themes
 
 
-def merge_config(base_config: Path, prefer_gemini_for_text: bool = True) -> Path:
-    """Load config JSON, force prefer_gemini_for_text, and write temp config."""
+def merge_config(base_config: Path, prefer_gemini_for_text: bool = True, concurrency: int = 1,
+                 no_cache: bool = False, shared_research_dir: Path = None, batch_api: bool = False) -> Path:
+    """Load config JSON, force prefer_gemini_for_text, and write temp config.
+
+    rate_limit_share tells each worker how many processes share the
+    per-provider rate limits, so N parallel runs stay within one quota.
+    """
     data = {}
     if base_config.exists():
         data = json.loads(base_config.read_text(encoding="utf-8"))
     data.setdefault("prefer_gemini_for_text", prefer_gemini_for_text)
+    data["rate_limit_share"] = max(1, concurrency)
+    if no_cache:
+        data.setdefault("llm_cache", {})["enabled"] = False
+    if shared_research_dir:
+        data["shared_research_dir"] = str(shared_research_dir)
+    if batch_api:
+        data.setdefault("batch_api", {})["enabled"] = True
     tmp = Path("/tmp/brain_batch_config.json")
     tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
     return tmp
 
 
+class ContextStream:
+    """Route writes to a per-theme log while themes run in-process.
+
+    The target lives in a ContextVar, so worker threads started by the phases
+    with contextvars.copy_context() keep writing to the same theme log.
+    """
+
+    def __init__(self, default, name: str):
+        self.default = default
+        self.target = contextvars.ContextVar(name, default=None)
+
+    def redirect(self, stream) -> None:
+        self.target.set(stream)
+
+    def reset(self) -> None:
+        self.target.set(None)
+
+    def _target(self):
+        return self.target.get() or self.default
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+def log_file_for(theme: str, log_dir: Path) -> Path:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    return log_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{theme[:24].replace(' ', '_')}.log"
+
+
+def run_shared_research(themes: List[str], config: dict, research_dir: Path, concurrency: int) -> dict:
+    """
+    Group themes by YouTube keyword and fetch search results + transcripts once per group.
+
+    Results are written to research_dir (one JSON per keyword); each theme's
+    Phase 2 picks them up through config["shared_research_dir"].
+    Returns {keyword: number of transcripts} (0 when the group's research failed).
+    """
+    sys.path.insert(0, str(ROOT_DIR))
+    import master_generator  # noqa: E402  (phase modules and SDKs are imported lazily)
+    from modules import phase2_knowhow, youtube_store  # noqa: E402
+
+    youtube_store.configure(config.get("youtube_store"))
+    groups = {}
+    for theme in themes:
+        groups.setdefault(master_generator.youtube_keyword_for(theme, config), []).append(theme)
+
+    max_videos = config.get("max_youtube_videos", 3)
+    deadline_sec = config.get("phase2_deadline_sec", 90)
+
+    def collect(keyword: str) -> int:
+        deadline = time.monotonic() + deadline_sec if deadline_sec else None
+        research = phase2_knowhow.collect_research(
+            keyword,
+            max_videos=max_videos,
+            transcript_workers=config.get("transcript_workers", 3),
+            deadline=deadline,
+            youtube_backend_name=config.get("youtube_backend", "auto"),
+            search_overfetch=config.get("search_overfetch", 2),
+        )
+        if not research or not research["video_data_list"]:
+            return 0
+        phase2_knowhow.save_research(research_dir, keyword, max_videos, research)
+        return len(research["video_data_list"])
+
+    print(f"🔎 共有リサーチ: {len(themes)}テーマ → {len(groups)}キーワード")
+    counts = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(groups)))) as pool:
+        futures = {pool.submit(contextvars.copy_context().run, collect, keyword): keyword for keyword in groups}
+        for future in as_completed(futures):
+            keyword = futures[future]
+            try:
+                counts[keyword] = future.result()
+            except Exception as e:
+                print(f"⚠️  共有リサーチ失敗: {keyword} ({e})")
+                counts[keyword] = 0
+            status = f"{counts[keyword]}件の字幕" if counts[keyword] else "失敗（各テーマのPhase 2で取得）"
+            print(f"  「{keyword}」({len(groups[keyword])}テーマ): {status}")
+    return counts
+
+
+# 1ステージでバッチを送り直す最大回数（map-reduceの要約 → 統合のように、結果を見てから次のプロンプトが決まる場合）
+BATCH_API_MAX_ROUNDS = 3
+
+
+def run_batch_api_stages(themes: List[str], target: str, config: dict, log_dir: Path) -> dict:
+    """
+    Run Phase 1-4's LLM requests for every theme through the batch APIs, one stage at a time.
+
+    For each phase: run it for every theme inside text_generation.collecting()
+    (requests are recorded instead of sent), submit them as one batch per
+    provider/model, poll until done, preload the results, then run the phase
+    for real so its output files become the next stage's input.
+    Images stay off here; the normal run_theme afterwards repeats Phase 1-4
+    from the preloaded results (no API calls) and does images, Phase 5 and 6.
+    Requests that fail in the batch simply fall back to interactive calls.
+    Phase 2 only runs here for themes whose research was saved by
+    run_shared_research, so the collecting passes never refetch YouTube.
+
+    Returns:
+        {theme: project_dir} (the normal run reuses these directories)
+    """
+    import master_generator  # noqa: E402
+    from modules import batch_api, phase2_knowhow, text_generation  # noqa: E402
+
+    stage_config = dict(config, enable_image_generation=False)
+    runners = {
+        1: lambda theme, project_dir: master_generator.run_phase1(project_dir, theme, target, stage_config),
+        2: lambda theme, project_dir: master_generator.run_phase2(project_dir, {}, stage_config, theme),
+        3: lambda theme, project_dir: master_generator.run_phase3(project_dir, {}, stage_config),
+        4: lambda theme, project_dir: master_generator.run_phase4(project_dir, {}, stage_config),
+    }
+    projects = {theme: master_generator.create_project_directory(theme) for theme in themes}
+    active = list(themes)
+
+    for phase, runner in runners.items():
+        if phase == 2:
+            # 収集のたびに検索・字幕取得をやり直さないよう、共有リサーチのないテーマは通常の実行に回す
+            for theme in list(active):
+                keyword = master_generator.youtube_keyword_for(theme, config)
+                research = phase2_knowhow.research_file(config["shared_research_dir"], keyword,
+                                                        config.get("max_youtube_videos", 3))
+                if not research.exists():
+                    print(f"  ⚠️  共有リサーチなし: {theme}（Phase 2以降は通常の呼び出し）")
+                    active.remove(theme)
+        if not active:
+            break
+        print(f"📦 バッチAPI: Phase {phase}（{len(active)}テーマ）")
+        for _ in range(BATCH_API_MAX_ROUNDS):
+            requests = {}
+            for theme in active:
+                # 収集中のフェーズは失敗扱いで終わるので、ログには出さない
+                with open(os.devnull, "w", encoding="utf-8") as devnull:
+                    sys.stdout.redirect(devnull)
+                    try:
+                        with text_generation.collecting() as collector:
+                            runner(theme, projects[theme])
+                    except Exception as e:
+                        print(f"⚠️  リクエスト収集失敗: {theme} ({e})", file=sys.__stdout__)
+                    finally:
+                        sys.stdout.reset()
+                collector.merge_into(requests)
+            if not requests:
+                break
+            results = batch_api.run(list(requests.values()), label=f"Phase {phase}")
+            text_generation.preload(requests.values(), results)
+            if len(results) < len(requests):
+                break  # 残りは通常の呼び出しで生成
+
+        # 結果を使って実行し、次のステージの入力ファイルを作る（ログはテーマごとのファイルに追記）
+        for theme in list(active):
+            with log_file_for(f"batch_phase{phase}_{theme}", log_dir).open("w", encoding="utf-8") as f:
+                sys.stdout.redirect(f)
+                sys.stderr.redirect(f)
+                try:
+                    output = runner(theme, projects[theme])
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+                    output = None
+                finally:
+                    sys.stdout.reset()
+                    sys.stderr.reset()
+            if not output:
+                # 以降のステージからは外す（通常の実行で最初からやり直す）
+                print(f"  ⚠️  Phase {phase} 失敗: {theme}")
+                active.remove(theme)
+
+    return projects
+
+
+def run_one_in_process(theme: str, target: str, config: dict, log_dir: Path, project_dir: Path = None) -> dict:
+    """
+    Run master_generator.run_theme in this process.
+
+    Imports and API clients (HTTP connection pools) are shared by every theme;
+    stdout/stderr of the calling thread go to the theme's own log file.
+    """
+    import master_generator  # noqa: E402  (loaded once per batch)
+
+    log_file = log_file_for(theme, log_dir)
+    print(f"▶️  start: {theme}")
+    result = {"success": False, "theme": theme, "drive_url": "", "total_chars": 0, "image_count": 0}
+    with log_file.open("w", encoding="utf-8") as f:
+        sys.stdout.redirect(f)
+        sys.stderr.redirect(f)
+        try:
+            result.update(master_generator.run_theme(theme, target, config, project_dir=project_dir))
+        except Exception:
+            import traceback
+            traceback.print_exc()
+        finally:
+            sys.stdout.reset()
+            sys.stderr.reset()
+    print(f"✅ success: {theme}" if result["success"] else f"❌ failed: {theme}")
+    return result
+
+
 def run_one(theme: str, target: str, config_path: Path, log_dir: Path) -> dict:
     """
     Run master_generator for a single theme.
@@ -103,8 +327,7 @@ def run_one(theme: str, target: str, config_path: Path, log_dir: Path) -> dict:
             "image_count": int
         }
     """
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_file = log_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{theme[:24].replace(' ', '_')}.log"
+    log_file = log_file_for(theme, log_dir)
     cmd = [
         sys.executable,
         str(MASTER),
@@ -146,44 +369,99 @@ def main():
     parser.add_argument("--theme-file", required=True, help="テーマ一覧ファイル（CSV/TSV/行区切り）")
     parser.add_argument("--config", default=str(ROOT_DIR / "test_config.json"), help="設定ファイルパス")
     parser.add_argument("--target", default="副業を始めたい30代会社員", help="ターゲットペルソナ")
-    parser.add_argument("--concurrency", type=int, default=1, help="同時実行数（簡易。>1は将来対応予定）")
+    parser.add_argument("--concurrency", type=int, default=1, help="同時実行数（Claude/Geminiのレート制限はワーカー間で分割）")
+    parser.add_argument("--in-process", action="store_true", help="テーマごとにプロセスを起動せず、同一プロセス内で実行（APIクライアントを共有）")
+    parser.add_argument("--no-cache", action="store_true", help="LLMレスポンスキャッシュを使わない")
+    parser.add_argument("--no-shared-research", action="store_true", help="YouTube検索・字幕取得をキーワードごとにまとめず、テーマごとに行う")
     parser.add_argument("--prefer-gemini-for-text", action="store_true", default=True, help="テキスト生成をGemini優先にする")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Phase 1〜4のLLMリクエストをステージごとに全テーマ分まとめてバッチAPIで送る（--in-processで実行）")
+    parser.add_argument("--batch-api-stub", action="store_true",
+                        help="バッチAPIの代わりにローカルの代替サーバーを使う（ネットワークなしの動作確認用）")
     args = parser.parse_args()
+    if args.batch_api_stub:
+        args.batch_api = True
+    if args.batch_api:
+        # ステージ間でバッチ結果をプロセス内に持つため
+        args.in_process = True
 
     themes = load_theme_list(Path(args.theme_file))
     if not themes:
         print("⚠️  テーマが0件です")
         sys.exit(1)
 
-    cfg = merge_config(Path(args.config), prefer_gemini_for_text=args.prefer_gemini_for_text)
-    line_token = os.environ.get("LINE_NOTIFY_TOKEN", "").strip()
-
+    concurrency = max(1, args.concurrency)
     batch_id = datetime.now().strftime("%Y%m%d-%H%M%S")
     log_dir = Path("/tmp/brain_batch_logs") / batch_id
+    # --batch-api ではPhase 2を何度も実行するので、同じ字幕を使えるよう常にキーワードごとに保存する
+    research_dir = None if args.no_shared_research and not args.batch_api else log_dir / "research"
+    # in-processでは全ワーカーが同じレート制限バケットを直接共有するので分割しない
+    cfg = merge_config(Path(args.config), prefer_gemini_for_text=args.prefer_gemini_for_text,
+                       concurrency=1 if args.in_process else concurrency, no_cache=args.no_cache,
+                       shared_research_dir=research_dir, batch_api=args.batch_api)
+    config = json.loads(cfg.read_text(encoding="utf-8"))
+    if args.batch_api_stub:
+        sys.path.insert(0, str(ROOT_DIR))
+        from modules import batch_stub_server  # noqa: E402
+
+        _, stub_url = batch_stub_server.start()
+        config["batch_api"].update({"anthropic_base_url": stub_url, "gemini_base_url": stub_url, "poll_interval_sec": 1})
+        print(f"🧪 バッチAPI代替サーバー: {stub_url}")
+    if args.in_process:
+        sys.path.insert(0, str(ROOT_DIR))
+        import master_generator  # noqa: E402
+
+        # 全テーマが同じプロセスでテキスト生成の送信スレッドを共有する
+        config["theme_workers"] = concurrency
+        master_generator.configure_runtime(config)
+        sys.stdout = ContextStream(sys.stdout, "batch_stdout")
+        sys.stderr = ContextStream(sys.stderr, "batch_stderr")
+    line_token = os.environ.get("LINE_NOTIFY_TOKEN", "").strip()
+
+    send_line_notify(line_token, f"🟢 Brainバッチ開始: {len(themes)}件 (batch_id={batch_id}, 同時実行={concurrency})")
+
+    # YouTubeのリサーチはキーワードごとに1回（失敗したキーワードは各テーマのPhase 2が自分で取得）
+    if research_dir:
+        run_shared_research(themes, config, research_dir, concurrency)
+
+    # Phase 1〜4のLLMリクエストをステージごとにバッチで処理（各テーマの通常実行はその結果を使う）
+    projects = {}
+    if args.batch_api:
+        projects = run_batch_api_stages(themes, args.target, config, log_dir)
 
-    send_line_notify(line_token, f"🟢 Brainバッチ開始: {len(themes)}件 (batch_id={batch_id})")
+    def worker(theme: str) -> dict:
+        send_line_notify(line_token, f"▶️ {theme}")
+        try:
+            if args.in_process:
+                return contextvars.copy_context().run(run_one_in_process, theme, args.target, config, log_dir,
+                                                          projects.get(theme))
+            return run_one(theme, args.target, cfg, log_dir)
+        except Exception as e:
+            print(f"❌ failed: {theme} ({e})")
+            return {"success": False, "theme": theme, "drive_url": "", "total_chars": 0, "image_count": 0}
 
     success = 0
     fail = 0
     results = []
-    for idx, theme in enumerate(themes, 1):
-        msg_head = f"[{idx}/{len(themes)}] {theme}"
-        send_line_notify(line_token, f"▶️ {msg_head}")
-        result = run_one(theme, args.target, cfg, log_dir)
-        results.append(result)
-        
-        if result["success"]:
-            success += 1
-            # 成功時にドライブURLを含めて通知
-            msg = f"✅ {msg_head}\n"
-            if result.get("drive_url"):
-                msg += f"📂 {result['drive_url']}\n"
-            msg += f"📝 {result.get('total_chars', 0):,}文字 | 🖼 {result.get('image_count', 0)}枚"
-            send_line_notify(line_token, msg)
-        else:
-            fail += 1
-            send_line_notify(line_token, f"❌ {msg_head}")
-        time.sleep(1)  # 軽いウェイト
+    # 完了した順に結果を集める
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, theme) for theme in themes]
+        for idx, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            msg_head = f"[{idx}/{len(themes)}] {result['theme']}"
+            
+            if result["success"]:
+                success += 1
+                # 成功時にドライブURLを含めて通知
+                msg = f"✅ {msg_head}\n"
+                if result.get("drive_url"):
+                    msg += f"📂 {result['drive_url']}\n"
+                msg += f"📝 {result.get('total_chars', 0):,}文字 | 🖼 {result.get('image_count', 0)}枚"
+                send_line_notify(line_token, msg)
+            else:
+                fail += 1
+                send_line_notify(line_token, f"❌ {msg_head}")
 
     # 最終サマリー
     summary_msg = f"🏁 Brainバッチ完了: 成功{success}/失敗{fail}\n\n"
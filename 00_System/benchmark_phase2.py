@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Phase 2 ベンチマーク
+記録済みのYouTubeデータ（FixtureBackend）で、検索・字幕取得・正規化・抽出プロンプト組み立てを
+それぞれ計測する（ネットワーク・LLM APIは使わない）
+
+使い方:
+  python benchmark_phase2.py                                   # 同梱のサンプルで計測
+  python benchmark_phase2.py --delay-sec 0.5 --workers 1       # ネットワーク遅延を模擬して並列数を比較
+  python benchmark_phase2.py --record "Threads 稼ぐ方法" --fixture-dir fixtures/threads  # 実データを記録
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# モジュールパスを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from modules import phase2_knowhow, transcript_text, youtube_backend, youtube_store
+
+
+DEFAULT_FIXTURE_DIR = Path(__file__).parent / "fixtures" / "phase2_sample"
+STAGES = ["search", "transcripts", "normalize", "prompt"]
+
+
+def run_once(backend, keyword, max_videos, workers, token_budget, knowhow_mode, map_chunk_tokens, search_overfetch):
+    """1回分を実行して段階ごとの秒数を返す"""
+    timings = {}
+
+    started = time.perf_counter()
+    videos = phase2_knowhow.search_youtube_videos(keyword, max_results=max_videos * search_overfetch, backend=backend)
+    timings["search"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    video_data_list, _, _ = phase2_knowhow.fetch_transcripts(videos, backend, workers, None, max_videos)
+    timings["transcripts"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    raw_chars = sum(len(video['transcript']) for video in video_data_list)
+    budget = None if knowhow_mode == "map_reduce" else token_budget
+    prepared = [dict(video, transcript=transcript_text.prepare(video['transcript'], budget)) for video in video_data_list]
+    timings["normalize"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if knowhow_mode == "map_reduce":
+        # map段の入力（チャンク分割）まで。要約はLLMを呼ぶので計測しない
+        chunks = [chunk for video in prepared for chunk in transcript_text.chunk(video['transcript'], map_chunk_tokens)]
+        prompt_tokens = sum(transcript_text.estimate_tokens(chunk) for chunk in chunks)
+    else:
+        prompt = phase2_knowhow.build_knowhow_prompt(prepared, "ベンチマーク用コンセプト")
+        prompt_tokens = transcript_text.estimate_tokens(prompt)
+    timings["prompt"] = time.perf_counter() - started
+
+    return timings, {
+        "videos": len(videos),
+        "transcripts": len(video_data_list),
+        "raw_chars": raw_chars,
+        "prepared_chars": sum(len(video['transcript']) for video in prepared),
+        "prompt_tokens": prompt_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phase 2 ベンチマーク（オフライン）")
+    parser.add_argument("--fixture-dir", default=str(DEFAULT_FIXTURE_DIR), help="記録済みデータのディレクトリ")
+    parser.add_argument("--record", metavar="KEYWORD", help="yt-dlpで実データを検索・取得して --fixture-dir に記録")
+    parser.add_argument("--keyword", default="Threads 稼ぐ方法", help="検索キーワード（フィクスチャでは表示のみ）")
+    parser.add_argument("--max-videos", type=int, default=3, help="必要な字幕の本数")
+    parser.add_argument("--search-overfetch", type=int, default=2, help="max_videosの何倍を検索するか")
+    parser.add_argument("--workers", type=int, default=3, help="字幕の同時取得数")
+    parser.add_argument("--delay-sec", type=float, default=0.0, help="1リクエストあたりの模擬ネットワーク遅延")
+    parser.add_argument("--token-budget", type=int, default=2000, help="動画1本あたりのトークン予算")
+    parser.add_argument("--knowhow-mode", choices=["single", "map_reduce"], default="single")
+    parser.add_argument("--map-chunk-tokens", type=int, default=3000)
+    parser.add_argument("--iterations", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+
+    if args.record:
+        recorded = youtube_backend.record_fixture(args.record, args.max_videos * args.search_overfetch, args.fixture_dir)
+        print(f"📼 記録完了: {recorded}件の字幕 → {args.fixture_dir}")
+        return
+
+    # 字幕ストア・検索キャッシュを使うと2回目以降が計測にならないので無効化
+    youtube_store.configure({"enabled": False})
+    backend = youtube_backend.FixtureBackend(args.fixture_dir, delay_sec=args.delay_sec)
+
+    samples = {stage: [] for stage in STAGES}
+    info = {}
+    for _ in range(args.iterations):
+        timings, info = run_once(
+            backend, args.keyword, args.max_videos, args.workers, args.token_budget,
+            args.knowhow_mode, args.map_chunk_tokens, args.search_overfetch
+        )
+        for stage in STAGES:
+            samples[stage].append(timings[stage])
+
+    print(f"\n⏱️  Phase 2 ベンチマーク（{args.iterations}回 / {args.fixture_dir}）")
+    print(f"  動画: {info['videos']}件 → 字幕: {info['transcripts']}件")
+    print(f"  字幕: {info['raw_chars']}文字 → 正規化後: {info['prepared_chars']}文字 / プロンプト約{info['prompt_tokens']}トークン")
+    print(f"  {'段階':<12} {'中央値':>10} {'最小':>10} {'最大':>10}")
+    for stage in STAGES:
+        values = samples[stage]
+        print(f"  {stage:<12} {statistics.median(values) * 1000:8.1f}ms {min(values) * 1000:8.1f}ms {max(values) * 1000:8.1f}ms")
+    total = sum(statistics.median(samples[stage]) for stage in STAGES)
+    print(f"  {'合計':<11} {total * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
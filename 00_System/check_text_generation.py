@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+テキスト生成チェーンのオフライン確認
+偽のプロバイダ（待ち時間・失敗を指定できる）で text_generation のフェイルオーバー・タイムアウト・
+ヘッジ・実行中リクエストの共有・レート制限待ち・出力上限・ストリームの停止の扱いを確かめる（LLM APIには接続しない）
+
+使い方:
+  python check_text_generation.py            # すべてのシナリオ
+  python check_text_generation.py hedge      # シナリオを指定
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+import time
+from pathlib import Path
+
+# モジュールパスを追加
+sys.path.insert(0, str(Path(__file__).parent))
+
+from modules import llm_cache, rate_limiter, text_generation
+
+
+MODELS = {"claude": "fake-claude", "gemini": "fake-gemini"}
+
+
+class FakeProvider:
+    """送信回数を数える偽のプロバイダ"""
+
+    def __init__(self, name, delay_sec=0.0, error=None, chunks=("ok",)):
+        self.name = name
+        self.delay_sec = delay_sec
+        self.error = error
+        self.chunks = chunks
+        self.sends = 0
+        self.max_tokens = []
+        self.lock = threading.Lock()
+
+    def generate(self, model, prompt, system=None, max_tokens=4000, stream=None):
+        with self.lock:
+            self.sends += 1
+            self.max_tokens.append(max_tokens)
+        if stream:
+            # チャンクごとに delay_sec 待つ（途中で止まるストリームを模擬）
+            stream.begin()
+            for chunk in self.chunks:
+                time.sleep(self.delay_sec)
+                stream.write(chunk)
+            stream.commit(len(self.chunks))
+            return "".join(self.chunks), text_generation.empty_usage()
+        time.sleep(self.delay_sec)
+        if self.error:
+            raise RuntimeError(self.error)
+        return f"{self.name}: {prompt}", text_generation.empty_usage()
+
+
+class FakeStream:
+    """phase4_writing.DraftStream の代わりに書き込みを記録する"""
+
+    def __init__(self):
+        self.parts = []
+        self.committed = None
+
+    def begin(self):
+        pass
+
+    def write(self, chunk):
+        self.parts.append(chunk)
+
+    def commit(self, output_tokens):
+        self.committed = "".join(self.parts)
+
+    def discard(self):
+        self.parts = []
+
+
+def setup(rate_limits=None, **settings):
+    """シナリオごとに設定・レート制限をリセットし、開始時点の統計を返す"""
+    llm_cache.configure(None, bypass=True)
+    rate_limiter.configure(dict({"claude": 0, "gemini": 0}, **(rate_limits or {})))
+    text_generation.configure(settings)
+    return text_generation.stats()
+
+
+def delta(before):
+    after = text_generation.stats()
+    return {key: after[key] - before[key] for key in after}
+
+
+def generate(chain, prompt):
+    return text_generation.generate(chain, prompt, models=MODELS, label=prompt)
+
+
+def check_failover():
+    before = setup()
+    claude, gemini = FakeProvider("claude", error="500 Internal Server Error"), FakeProvider("gemini")
+    result = generate([claude, gemini], "failover")
+    stats = delta(before)
+    return [
+        ("2番手の応答を使う", result["provider"] == "gemini"),
+        ("failovers = 1", stats["failovers"] == 1),
+    ]
+
+
+def check_timeout():
+    before = setup(timeout_sec=0.3)
+    claude, gemini = FakeProvider("claude", delay_sec=1.0), FakeProvider("gemini")
+    result = generate([claude, gemini], "timeout")
+    stats = delta(before)
+    return [
+        ("タイムアウト後に2番手の応答を使う", result["provider"] == "gemini"),
+        ("timeouts = 1", stats["timeouts"] == 1),
+        ("待ち時間は timeout_sec 程度", result["seconds"] < 0.8),
+    ]
+
+
+def check_hedge():
+    before = setup(timeout_sec=5, hedge=True, hedge_min_samples=5)
+    claude, gemini = FakeProvider("claude", delay_sec=0.05), FakeProvider("gemini", delay_sec=0.05)
+    # p95の履歴を作る
+    for i in range(5):
+        generate([claude, gemini], f"warmup {i}")
+    claude.delay_sec = 1.0
+    result = generate([claude, gemini], "hedge")
+    stats = delta(before)
+    return [
+        ("ヘッジ先の応答を使う", result["provider"] == "gemini"),
+        ("hedges = 1 / hedge_wins = 1", stats["hedges"] == 1 and stats["hedge_wins"] == 1),
+        ("タイムアウトしない", stats["timeouts"] == 0),
+    ]
+
+
+def check_shared():
+    before = setup()
+    claude, gemini = FakeProvider("claude", delay_sec=0.3), FakeProvider("gemini")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: generate([claude, gemini], "shared"), range(4)))
+    stats = delta(before)
+    return [
+        ("全員が同じ応答を受け取る", all(r["text"] == "claude: shared" for r in results)),
+        ("送信は1回", claude.sends == 1 and gemini.sends == 0),
+        ("shared = 3", stats["shared"] == 3),
+    ]
+
+
+def check_rate_limit():
+    # 60rpm（1秒に1件）の枠に6件同時: 最後の1件は5秒待つが、送信前の待ちはタイムアウトに数えない
+    before = setup(rate_limits={"claude": 60}, timeout_sec=1.5)
+    claude, gemini = FakeProvider("claude", delay_sec=0.1), FakeProvider("gemini")
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda i: generate([claude, gemini], f"rate limit {i}"), range(6)))
+    stats = delta(before)
+    return [
+        ("すべて1番手の応答", all(r["provider"] == "claude" for r in results)),
+        ("timeouts = 0 / failovers = 0", stats["timeouts"] == 0 and stats["failovers"] == 0),
+        ("送信は claude 6件 / gemini 0件", claude.sends == 6 and gemini.sends == 0),
+    ]
+
+
+def check_abandoned():
+    # ヘッジ先（gemini）が枠待ちの間に1番手が返ったら、ヘッジ先には送らない
+    before = setup(rate_limits={"gemini": 30}, timeout_sec=5, hedge=True, hedge_min_samples=5)
+    claude, gemini = FakeProvider("claude", delay_sec=0.05), FakeProvider("gemini")
+    for i in range(5):
+        generate([claude, gemini], f"warmup {i}")
+    rate_limiter.acquire("gemini")  # 枠を使い切っておく（次の1件は約2秒待ち）
+    claude.delay_sec = 0.6
+    result = generate([claude, gemini], "abandoned")
+    time.sleep(2.5)  # 枠待ちのスレッドが枠を取るまで待つ
+    stats = delta(before)
+    return [
+        ("1番手の応答を使う", result["provider"] == "claude"),
+        ("ヘッジした", stats["hedges"] == 1 and stats["hedge_wins"] == 0),
+        ("枠待ちのまま不要になったヘッジは送信しない", gemini.sends == 0),
+    ]
+
+
+def check_output_limit():
+    # Geminiは上限なし（None）、limit_gemini のときだけ max_tokens を渡す
+    setup()
+    claude, gemini = FakeProvider("claude", error="500 Internal Server Error"), FakeProvider("gemini")
+    text_generation.generate([claude, gemini], "no limit", max_tokens=4000, models=MODELS)
+    text_generation.generate([claude, gemini], "limit", max_tokens=800, models=MODELS, limit_gemini=True)
+    return [
+        ("Claudeには常に max_tokens", claude.max_tokens == [4000, 800]),
+        ("Geminiは limit_gemini のときだけ上限", gemini.max_tokens == [None, 800]),
+    ]
+
+
+def check_stream_stall():
+    # 1番手のストリームが2チャンク目で止まる: timeout_sec で見切って2番手が書き直す
+    before = setup(timeout_sec=0.5)
+    steady = FakeProvider("claude", delay_sec=0.1, chunks=("a",) * 10)  # 0.1秒ごとに届く間は止まっていない
+    stalled = FakeProvider("claude", delay_sec=2.0, chunks=("a", "b"))
+    gemini = FakeProvider("gemini", delay_sec=0.05, chunks=("x", "y"))
+    steady_result = text_generation.generate([steady, gemini], "steady", models=MODELS, stream=FakeStream())
+    stream = FakeStream()
+    result = text_generation.generate([stalled, gemini], "stall", models=MODELS, stream=stream)
+    time.sleep(2.2)  # 見切ったストリームのチャンクが届くまで待つ
+    stats = delta(before)
+    return [
+        ("チャンクが届き続ける間は合計が timeout_sec を超えても待つ", steady_result["provider"] == "claude"),
+        ("止まったら2番手の応答を使う", result["provider"] == "gemini" and result["seconds"] < 1.5),
+        ("timeouts = 1", stats["timeouts"] == 1),
+        ("見切った後のチャンクは書き込まない", stream.committed == "xy" and stream.parts == ["x", "y"]),
+    ]
+
+
+SCENARIOS = {
+    "failover": check_failover,
+    "timeout": check_timeout,
+    "hedge": check_hedge,
+    "shared": check_shared,
+    "rate_limit": check_rate_limit,
+    "abandoned": check_abandoned,
+    "output_limit": check_output_limit,
+    "stream_stall": check_stream_stall,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(SCENARIOS)
+    failed = 0
+    for name in names:
+        started = time.monotonic()
+        checks = SCENARIOS[name]()
+        ok = all(passed for _, passed in checks)
+        failed += 0 if ok else 1
+        print(f"{'✅' if ok else '❌'} {name} ({time.monotonic() - started:.1f}秒)")
+        for i, (description, passed) in enumerate(checks):
+            branch = "└─" if i == len(checks) - 1 else "├─"
+            print(f"  {branch} {'✓' if passed else '✗'} {description}")
+    print(f"\n{len(names) - failed}/{len(names)} シナリオ成功")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
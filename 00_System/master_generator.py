@@ -4,9 +4,12 @@ Brain Content System Ver2.0 - Master Generator
 1コマンドでBrain/Tips記事を完成させるメインスクリプト
 """
 
+import time
+
+_STARTED = time.perf_counter()
+
 import argparse
 import sys
-import time
 from pathlib import Path
 from datetime import datetime
 import json
@@ -14,8 +17,15 @@ import json
 # モジュールパスを追加
 sys.path.insert(0, str(Path(__file__).parent))
 
-from modules import phase1_research, phase2_knowhow, phase3_structure
-from modules import phase4_writing, phase5_integration, phase6_drive_upload
+# フェーズモジュール（と、その先のSDK）は実行するときに初めてimportする
+from modules import batch_api, checkpoint, clients, credentials, llm_cache, rate_limiter, startup_profile, text_generation, youtube_store
+
+startup_profile.record("master_generator (core)", time.perf_counter() - _STARTED)
+
+
+def load_phase(name):
+    """フェーズモジュールを遅延import"""
+    return startup_profile.timed_import(f"modules.{name}")
 
 
 def print_header():
@@ -39,8 +49,21 @@ def print_footer(start_time, stats):
     print(f"\n  Claude API使用量:")
     print(f"    入力: {stats['claude_input_tokens']:,}トークン (${stats['claude_input_cost']:.3f})")
     print(f"    出力: {stats['claude_output_tokens']:,}トークン (${stats['claude_output_cost']:.3f})")
+    if stats.get('claude_cache_write_tokens') or stats.get('claude_cache_read_tokens'):
+        print(f"    プロンプトキャッシュ: 書き込み{stats['claude_cache_write_tokens']:,} / 読み出し{stats['claude_cache_read_tokens']:,}トークン")
+    if stats.get('claude_map_input_tokens') or stats.get('claude_map_output_tokens'):
+        print(f"    チャンク要約（Haiku）: 入力{stats['claude_map_input_tokens']:,} / 出力{stats['claude_map_output_tokens']:,}トークン（費用は上の入力・出力に含む）")
     print(f"\n  Gemini API使用量:")
     print(f"    画像生成: {stats['image_count']}枚 (無料枠内)")
+    cache_stats = stats.get('cache', {})
+    if cache_stats:
+        print(f"\n  LLMキャッシュ: ヒット{cache_stats['hits']}件 / ミス{cache_stats['misses']}件")
+    generation_stats = stats.get('text_generation', {})
+    if generation_stats.get('failovers') or generation_stats.get('hedges') or generation_stats.get('timeouts'):
+        print(f"  フェイルオーバー: {generation_stats['failovers']}件（タイムアウト{generation_stats['timeouts']}件）"
+              f" / ヘッジ: {generation_stats['hedges']}件（2番手が先着{generation_stats['hedge_wins']}件）")
+    if generation_stats.get('batch_results'):
+        print(f"  バッチAPI: {generation_stats['batch_results']}件（割引 ${stats['batch_discount']:.3f}、入力・出力の費用に反映済み）")
     print(f"\n💰 今回のコスト: ${stats['total_cost']:.3f} ≈ ¥{int(stats['total_cost'] * 156)}")
     print(f"\n📁 成果物:")
     print(f"  ✅ {stats['output_md']}")
@@ -64,15 +87,18 @@ def print_footer(start_time, stats):
     print()
 
 
-def create_project_directory(theme):
-    """プロジェクトディレクトリを作成"""
-    # プロジェクト名を生成（日付 + テーマの略称）
-    date_str = datetime.now().strftime("%Y%m%d")
-    theme_short = theme.replace(" ", "_")[:20]
-    project_name = f"{date_str}_{theme_short}"
-    
-    # ベースディレクトリ
-    base_dir = Path(__file__).parent.parent / "03_Projects" / project_name
+def create_project_directory(theme, project_dir=None):
+    """プロジェクトディレクトリを作成（project_dir指定時は既存プロジェクトを再利用）"""
+    if project_dir:
+        base_dir = Path(project_dir)
+    else:
+        # プロジェクト名を生成（日付 + テーマの略称）
+        date_str = datetime.now().strftime("%Y%m%d")
+        theme_short = theme.replace(" ", "_")[:20]
+        project_name = f"{date_str}_{theme_short}"
+        
+        # ベースディレクトリ
+        base_dir = Path(__file__).parent.parent / "03_Projects" / project_name
     
     # サブディレクトリを作成
     (base_dir / "01_Research").mkdir(parents=True, exist_ok=True)
@@ -91,17 +117,43 @@ def run_phase1(project_dir, theme, target, config):
     """Phase 1: リサーチ & コンセプト定義"""
     print("\n[Phase 1] リサーチ & コンセプト定義")
     prefer_gemini = config.get('prefer_gemini_for_text', True)
-    result = phase1_research.run(project_dir, theme, target, prefer_gemini=prefer_gemini)
+    result = load_phase("phase1_research").run(project_dir, theme, target, prefer_gemini=prefer_gemini)
     return result if result else {}
 
 
-def run_phase2(project_dir, phase1_output, config):
+def youtube_keyword_for(theme, config):
+    """テーマのYouTube検索キーワード（theme_keywords で個別指定、なければ youtube_keyword）"""
+    return (config.get('theme_keywords') or {}).get(theme) or config.get('youtube_keyword', 'Threads 稼ぐ方法')
+
+
+def run_phase2(project_dir, phase1_output, config, theme=None):
     """Phase 2: ノウハウ抽出"""
     print("\n[Phase 2] ノウハウ抽出")
-    keyword = config.get('youtube_keyword', 'Threads 稼ぐ方法')
+    keyword = youtube_keyword_for(theme, config)
     max_videos = config.get('max_youtube_videos', 3)
     prefer_gemini = config.get('prefer_gemini_for_text', True)
-    result = phase2_knowhow.run(project_dir, keyword=keyword, max_videos=max_videos, prefer_gemini=prefer_gemini)
+    phase2 = load_phase("phase2_knowhow")
+    
+    # batch_runnerがキーワードごとに取得済みの検索結果・字幕
+    research = None
+    if config.get('shared_research_dir'):
+        research = phase2.load_research(config['shared_research_dir'], keyword, max_videos)
+    
+    result = phase2.run(
+        project_dir,
+        keyword=keyword,
+        max_videos=max_videos,
+        prefer_gemini=prefer_gemini,
+        transcript_workers=config.get('transcript_workers', 3),
+        deadline_sec=config.get('phase2_deadline_sec', 90),
+        youtube_backend_name=config.get('youtube_backend', 'auto'),
+        research=research,
+        search_overfetch=config.get('search_overfetch', 2),
+        transcript_token_budget=config.get('transcript_token_budget', 2000),
+        knowhow_mode=config.get('knowhow_mode', 'single'),
+        map_chunk_tokens=config.get('map_chunk_tokens', 3000),
+        map_workers=config.get('map_workers', 4)
+    )
     return result if result else {}
 
 
@@ -109,29 +161,37 @@ def run_phase3(project_dir, phase2_output, config):
     """Phase 3: 構成設計 & ビジュアル計画"""
     print("\n[Phase 3] 構成設計 & ビジュアル計画")
     prefer_gemini = config.get('prefer_gemini_for_text', True)
-    result = phase3_structure.run(project_dir, prefer_gemini=prefer_gemini)
+    result = load_phase("phase3_structure").run(project_dir, prefer_gemini=prefer_gemini)
     return result if result else {}
 
 
-def run_phase4(project_dir, phase3_output, config):
-    """Phase 4: 執筆 & 画像生成"""
+def run_phase4(project_dir, phase3_output, config, on_section_done=None):
+    """Phase 4: 執筆 & 画像生成（on_section_done: 完成したセクションを受け取る関数）"""
     print("\n[Phase 4] 執筆 & 画像生成")
     enable_text = config.get('enable_text_generation', True)
     enable_image = config.get('enable_image_generation', True)
     prefer_gemini_for_text = config.get('prefer_gemini_for_text', False)
-    result = phase4_writing.run(
+    result = load_phase("phase4_writing").run(
         project_dir,
         enable_text_generation=enable_text,
         enable_image_generation=enable_image,
-        prefer_gemini_for_text=prefer_gemini_for_text
+        prefer_gemini_for_text=prefer_gemini_for_text,
+        text_concurrency=config.get('text_concurrency', 4),
+        text_max_retries=config.get('text_max_retries', 2),
+        image_concurrency=config.get('image_concurrency', 3),
+        image_max_retries=config.get('image_max_retries', 4),
+        knowhow_top_k=config.get('knowhow_top_k', 0),
+        knowhow_token_budget=config.get('knowhow_token_budget', 1500),
+        stream_text=config.get('stream_text', False),
+        on_section_done=on_section_done
     )
     return result if result else {}
 
 
-def run_phase5(project_dir, phase4_output, config):
-    """Phase 5: 統合 & パッケージング"""
+def run_phase5(project_dir, phase4_output, config, drafts=None):
+    """Phase 5: 統合 & パッケージング（drafts: Phase 4と並行して本文を取り込んだ DraftAssembler）"""
     print("\n[Phase 5] 統合 & パッケージング")
-    result = phase5_integration.run(project_dir)
+    result = load_phase("phase5_integration").run(project_dir, drafts=drafts)
     return result if result else {}
 
 
@@ -142,58 +202,149 @@ def run_phase6(project_dir, phase5_output, config, theme):
         return {}
     
     print("\n[Phase 6] Googleドライブアップロード")
-    result = phase6_drive_upload.run(project_dir, theme, config)
+    result = load_phase("phase6_drive_upload").run(project_dir, theme, config)
     return result if result else {}
 
 
-def main():
-    """メイン処理"""
-    parser = argparse.ArgumentParser(description="Brain Content System Ver2.0")
-    parser.add_argument("--theme", required=True, help="記事のテーマ")
-    parser.add_argument("--target", default="副業を始めたい30代会社員", help="ターゲットペルソナ")
-    parser.add_argument("--config", help="設定ファイルパス（JSON）")
+def batch_discount(batch_usage):
+    """
+    バッチAPIの結果から返したトークンの割引額（通常単価の半額）
+
+    Args:
+        batch_usage: text_generation.track_batch_usage() の集計（{model: usage}）
+
+    Returns:
+        (入力の割引額, 出力の割引額)
+    """
+    input_discount = 0.0
+    output_discount = 0.0
+    for model, usage in batch_usage.items():
+        # 単価は上の集計と同じ（チャンク要約のHaikuは入力$0.8 / 出力$4、それ以外は$3 / $15）
+        input_price, output_price = (0.8, 4) if "haiku" in model else (3, 15)
+        input_discount += (
+            usage['input_tokens'] * input_price +
+            usage['cache_creation_input_tokens'] * input_price * 1.25 +
+            usage['cache_read_input_tokens'] * input_price * 0.1
+        ) / 1_000_000 / 2
+        output_discount += usage['output_tokens'] * output_price / 1_000_000 / 2
+    return input_discount, output_discount
+
+
+def stats_since(before, after):
+    """カウンタの差分（llm_cache.stats() / text_generation.stats() の開始時点からの増分）"""
+    return {key: value - before.get(key, 0) for key, value in after.items()}
+
+
+def run_checkpointed(phase, runner, manifest, project_dir, theme, target, config,
+                     resume=False, from_phase=1, to_phase=6):
+    """
+    マニフェストを見てフェーズを実行またはスキップ
     
-    args = parser.parse_args()
+    - --from-phase / --to-phase の範囲外は実行しない（前回の結果を引き継ぐ）
+    - --resume 時は入力ハッシュが前回と同じで出力も無傷ならスキップ
+    """
+    if phase < from_phase or phase > to_phase:
+        print(f"\n[Phase {phase}] ⏭️  スキップ（実行範囲外）")
+        return manifest.cached_result(phase)
+    
+    input_hash = checkpoint.phase_input_hash(phase, project_dir, theme, target, config)
+    if resume and manifest.is_fresh(phase, input_hash):
+        print(f"\n[Phase {phase}] ⏭️  スキップ（入力・出力に変更なし）")
+        return manifest.cached_result(phase)
+    
+    output = runner()
+    if output:
+        manifest.record(phase, input_hash, output)
+    return output
+
+
+def configure_runtime(config, no_cache=False):
+    """プロセス全体で共有する設定（APIキー・接続プール・レート制限・キャッシュ）を反映"""
+    # APIキーは1度だけ解決し、使えるプロバイダを1行で報告
+    credentials.configure(config.get('env_file'))
+    credentials.report()
+    
+    # APIクライアントの接続プール・タイムアウト
+    clients.configure(config.get('http_client'))
+    
+    # レート制限（batch_runnerの同時実行時は枠をワーカー数で分割）
+    rate_limiter.configure(config.get('rate_limits'), share=config.get('rate_limit_share', 1))
+    
+    # LLMレスポンスキャッシュ
+    llm_cache.configure(config.get('llm_cache'), bypass=no_cache)
+    
+    # テキスト生成のプロバイダ順・フェイルオーバー・ヘッジ
+    # 送信スレッド数の既定: 同時実行テーマ数 × フェーズ内の並列数 × 2（ヘッジ・待つのをやめたリクエストの分）
+    generation_settings = dict(config.get('text_generation') or {})
+    if not generation_settings.get('executor_workers'):
+        phase_workers = max(config.get('text_concurrency', 4), config.get('map_workers', 4))
+        generation_settings['executor_workers'] = config.get('theme_workers', 1) * phase_workers * 2
+    text_generation.configure(generation_settings)
+    
+    # バッチAPI（batch_runner --batch-api）
+    batch_api.configure(config.get('batch_api'))
+    
+    # YouTube字幕ストア（Phase 2）
+    youtube_store.configure(config.get('youtube_store'))
+
+
+def run_theme(theme, target, config, resume=False, from_phase=1, to_phase=6, project_dir=None):
+    """
+    1テーマ分の記事を生成（batch_runnerからプロセス内で直接呼び出せるAPI）
+    
+    configure_runtime() は呼び出し側で1度だけ実行しておくこと。
     
+    Returns:
+        dict: result.json と同じ内容
+    """
     # 開始時刻
     start_time = time.time()
     
+    # キャッシュ・フェイルオーバーのカウンタはプロセス全体の累計なので、開始時点との差を表示する
+    # （batch_runner --in-process で前のテーマの分を含めない）
+    cache_stats_before = llm_cache.stats()
+    generation_stats_before = text_generation.stats()
+    batch_usage = text_generation.track_batch_usage()
+    
     # ヘッダー表示
     print_header()
     
-    # 設定読み込み
-    config = {}
-    if args.config and Path(args.config).exists():
-        with open(args.config, "r", encoding="utf-8") as f:
-            config = json.load(f)
-    
     # 設定確認表示
     print(f"\n📋 設定確認:")
-    print(f"  テーマ: {args.theme}")
-    print(f"  ターゲット: {args.target}")
+    print(f"  テーマ: {theme}")
+    print(f"  ターゲット: {target}")
     
     # プロジェクトディレクトリ作成
-    project_dir = create_project_directory(args.theme)
+    project_dir = create_project_directory(theme, project_dir)
     print(f"  プロジェクト: {project_dir.name}")
+    if resume or from_phase > 1 or to_phase < 6:
+        print(f"  再開: Phase {from_phase}〜{to_phase}{'（変更のないフェーズはスキップ）' if resume else ''}")
     print("\n" + "━" * 60)
     
+    manifest = checkpoint.Manifest(project_dir, config)
+    
+    def step(phase, runner):
+        return run_checkpointed(phase, runner, manifest, project_dir, theme, target, config,
+                                resume=resume, from_phase=from_phase, to_phase=to_phase)
+    
     # Phase 1
-    phase1_output = run_phase1(project_dir, args.theme, args.target, config)
+    phase1_output = step(1, lambda: run_phase1(project_dir, theme, target, config))
     
     # Phase 2
-    phase2_output = run_phase2(project_dir, phase1_output, config)
+    phase2_output = step(2, lambda: run_phase2(project_dir, phase1_output, config, theme))
     
     # Phase 3
-    phase3_output = run_phase3(project_dir, phase2_output, config)
+    phase3_output = step(3, lambda: run_phase3(project_dir, phase2_output, config))
     
-    # Phase 4
-    phase4_output = run_phase4(project_dir, phase3_output, config)
+    # Phase 4（Phase 5の本文統合は、完成したセクションから並行して進める）
+    drafts = load_phase("phase5_integration").DraftAssembler(project_dir)
+    phase4_output = step(4, lambda: run_phase4(project_dir, phase3_output, config, on_section_done=drafts.add))
     
     # Phase 5
-    phase5_output = run_phase5(project_dir, phase4_output, config)
+    phase5_output = step(5, lambda: run_phase5(project_dir, phase4_output, config, drafts=drafts))
     
     # Phase 6
-    phase6_output = run_phase6(project_dir, phase5_output, config, args.theme)
+    phase6_output = step(6, lambda: run_phase6(project_dir, phase5_output, config, theme))
     
     # 統計情報
     total_input_tokens = (
@@ -209,8 +360,26 @@ def main():
         phase4_output.get('total_output_tokens', 0)
     )
     
-    input_cost = total_input_tokens / 1_000_000 * 3
-    output_cost = total_output_tokens / 1_000_000 * 15
+    # プロンプトキャッシュ（Phase 4）: 書き込みは入力単価の1.25倍、読み出しは0.1倍
+    cache_write_tokens = phase4_output.get('cache_creation_input_tokens', 0)
+    cache_read_tokens = phase4_output.get('cache_read_input_tokens', 0)
+    
+    # map-reduceのチャンク要約（Phase 2、Haiku）: 入力$0.8 / 出力$4（100万トークンあたり）
+    map_input_tokens = phase2_output.get('map_input_tokens', 0)
+    map_output_tokens = phase2_output.get('map_output_tokens', 0)
+    
+    input_cost = (
+        total_input_tokens / 1_000_000 * 3 +
+        cache_write_tokens / 1_000_000 * 3.75 +
+        cache_read_tokens / 1_000_000 * 0.3 +
+        map_input_tokens / 1_000_000 * 0.8
+    )
+    output_cost = total_output_tokens / 1_000_000 * 15 + map_output_tokens / 1_000_000 * 4
+    
+    # バッチAPI（--batch-api）の結果から返した分だけ半額（通常の呼び出しにフォールバックした分は定価）
+    batch_input_discount, batch_output_discount = batch_discount(batch_usage)
+    input_cost -= batch_input_discount
+    output_cost -= batch_output_discount
     total_cost = input_cost + output_cost
     
     stats = {
@@ -218,32 +387,82 @@ def main():
         "image_count": phase5_output.get("image_count", 0),
         "claude_input_tokens": total_input_tokens,
         "claude_output_tokens": total_output_tokens,
+        "claude_cache_write_tokens": cache_write_tokens,
+        "claude_cache_read_tokens": cache_read_tokens,
+        "claude_map_input_tokens": map_input_tokens,
+        "claude_map_output_tokens": map_output_tokens,
         "claude_input_cost": input_cost,
         "claude_output_cost": output_cost,
+        "batch_discount": batch_input_discount + batch_output_discount,
         "total_cost": total_cost,
         "output_md": phase5_output.get("final_md", ""),
         "output_html": phase5_output.get("final_html", ""),
         "output_zip": phase5_output.get("images_zip", ""),
-        "drive_url": phase6_output.get("folder_url", "") if phase6_output else ""
+        "drive_url": phase6_output.get("folder_url", "") if phase6_output else "",
+        "cache": stats_since(cache_stats_before, llm_cache.stats()),
+        "text_generation": stats_since(generation_stats_before, text_generation.stats())
     }
     
     # フッター表示
     print_footer(start_time, stats)
     
     # 結果をJSONファイルに保存（batch_runner用）
+    result = {
+        "success": True,
+        "theme": theme,
+        "project_dir": str(project_dir),
+        "drive_url": stats.get("drive_url", ""),
+        "total_chars": stats["total_chars"],
+        "image_count": stats["image_count"],
+        "total_cost": stats["total_cost"]
+    }
     result_file = project_dir / "result.json"
     with open(result_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "success": True,
-            "theme": args.theme,
-            "project_dir": str(project_dir),
-            "drive_url": stats.get("drive_url", ""),
-            "total_chars": stats["total_chars"],
-            "image_count": stats["image_count"],
-            "total_cost": stats["total_cost"]
-        }, f, ensure_ascii=False, indent=2)
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    
+    return result
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Brain Content System Ver2.0")
+    parser.add_argument("--theme", required=True, help="記事のテーマ")
+    parser.add_argument("--target", default="副業を始めたい30代会社員", help="ターゲットペルソナ")
+    parser.add_argument("--config", help="設定ファイルパス（JSON）")
+    parser.add_argument("--no-cache", action="store_true", help="LLMレスポンスキャッシュを使わない")
+    parser.add_argument("--resume", action="store_true", help="入力が変わっていないフェーズをスキップして再開")
+    parser.add_argument("--from-phase", type=int, default=1, choices=range(1, 7), help="このフェーズから実行")
+    parser.add_argument("--to-phase", type=int, default=6, choices=range(1, 7), help="このフェーズまで実行")
+    parser.add_argument("--project-dir", help="既存のプロジェクトディレクトリを使う（日付をまたいだ再開用）")
+    parser.add_argument("--profile-startup", action="store_true", help="モジュールごとのimport時間を表示（起動時の分はPhase 1の前、遅延importの分は実行後）")
+    
+    args = parser.parse_args()
+    
+    # 設定読み込み
+    config = {}
+    if args.config and Path(args.config).exists():
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    
+    configure_runtime(config, no_cache=args.no_cache)
+    
+    startup_records = []
+    if args.profile_startup:
+        startup_records = startup_profile.report("起動プロファイル（Phase 1開始前のimport時間）")
+    
+    run_theme(
+        args.theme,
+        args.target,
+        config,
+        resume=args.resume,
+        from_phase=args.from_phase,
+        to_phase=args.to_phase,
+        project_dir=args.project_dir
+    )
+    
+    if args.profile_startup:
+        startup_profile.report("遅延importの時間（フェーズ実行中）", start=len(startup_records))
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+バッチAPI（Anthropic Message Batches / Gemini Batch Mode）
+text_generation.collecting() で集めたリクエストをプロバイダ・モデルごとに1つのバッチとして送信し、
+完了までポーリングして結果を返す（対話型APIの半額。レート制限も別枠）
+
+ネットワークなしで試すときは modules.batch_stub_server を起動し、batch_api の
+anthropic_base_url / gemini_base_url をそのURLにする
+"""
+
+import time
+
+from . import clients, credentials, text_generation
+
+
+# 設定ファイルの batch_api で上書き可能
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "poll_interval_sec": 30,
+    "max_wait_hours": 24,
+    "anthropic_base_url": None,
+    "gemini_base_url": None,
+}
+
+GEMINI_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED",
+                      "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+_settings = dict(DEFAULT_SETTINGS)
+
+
+def configure(settings=None):
+    """
+    設定を反映
+
+    Args:
+        settings: {"enabled": bool, "poll_interval_sec": float, "max_wait_hours": float,
+                   "anthropic_base_url": str, "gemini_base_url": str}
+    """
+    global _settings
+    _settings = dict(DEFAULT_SETTINGS)
+    _settings.update(settings or {})
+
+
+def is_enabled():
+    return bool(_settings.get("enabled"))
+
+
+class AnthropicBatch:
+    """Message Batches（1バッチ = 1モデル分のリクエスト。custom_id はリクエストのキー）"""
+
+    def __init__(self, requests):
+        # 通常の呼び出しと同じ接続プール・タイムアウト設定のクライアント
+        self.client = clients.get_claude_client(
+            credentials.get_claude_api_key(), base_url=_settings.get("anthropic_base_url") or None
+        )
+        self.requests = requests
+        self.batch_id = None
+
+    def submit(self):
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": request["key"],
+                "params": text_generation.ClaudeProvider.build_request(
+                    request["model"], request["prompt"], request["system"], request["output_limit"]
+                ),
+            }
+            for request in self.requests
+        ])
+        self.batch_id = batch.id
+        return batch.id
+
+    def done(self):
+        return self.client.messages.batches.retrieve(self.batch_id).processing_status == "ended"
+
+    def results(self):
+        results = {}
+        for entry in self.client.messages.batches.results(self.batch_id):
+            if entry.result.type != "succeeded":
+                continue
+            message = entry.result.message
+            usage = {key: getattr(message.usage, key, 0) or 0 for key in text_generation.USAGE_KEYS}
+            results[entry.custom_id] = {"text": message.content[0].text, "usage": usage}
+        return results
+
+
+class GeminiBatch:
+    """Batch Mode（インラインリクエスト。結果はリクエストと同じ順に返る）"""
+
+    def __init__(self, requests):
+        # バッチはv1betaのみ（通常のクライアントはv1）
+        self.client = clients.get_gemini_client(
+            credentials.get_gemini_api_key(), api_version="v1beta", base_url=_settings.get("gemini_base_url") or None
+        )
+        self.requests = requests
+        self.job_name = None
+
+    def submit(self):
+        job = self.client.batches.create(
+            model=self.requests[0]["model"],
+            src=[
+                {
+                    "contents": [{"role": "user", "parts": [{"text": request["prompt"]}]}],
+                    "config": text_generation.GeminiProvider.build_config(request["system"], request["output_limit"]),
+                }
+                for request in self.requests
+            ],
+            config={"display_name": f"brain-content-{int(time.time())}"},
+        )
+        self.job_name = job.name
+        return job.name
+
+    def _job(self):
+        return self.client.batches.get(name=self.job_name)
+
+    def done(self):
+        return getattr(self._job().state, "name", None) in GEMINI_DONE_STATES
+
+    def results(self):
+        job = self._job()
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+        results = {}
+        for request, response in zip(self.requests, responses):
+            if response.error or not response.response:
+                continue
+            text = response.response.text
+            if text:
+                results[request["key"]] = {"text": text, "usage": text_generation.empty_usage()}  # Geminiのトークン情報は未集計
+        return results
+
+
+BATCH_CLASSES = {
+    "claude": AnthropicBatch,
+    "gemini": GeminiBatch,
+}
+
+
+def run(requests, label=""):
+    """
+    リクエストをプロバイダ・モデルごとのバッチで送信し、すべて終わるまで待つ
+
+    Args:
+        requests: text_generation.Collector.requests の値
+        label: ログ用（例: "Phase 1"）
+
+    Returns:
+        {key: {"text", "usage"}}（失敗・期限切れのリクエストは含まない。それらは通常の呼び出しで生成される）
+    """
+    groups = {}
+    for request in requests:
+        groups.setdefault((request["provider"], request["model"]), []).append(request)
+
+    batches = []
+    for (provider, model), group in groups.items():
+        try:
+            batch = BATCH_CLASSES[provider](group)
+            batch_id = batch.submit()
+        except Exception as e:
+            print(f"  ⚠️  バッチ送信失敗（{provider} / {model}）: {e}")
+            continue
+        print(f"  ├─ {label} バッチ送信: {provider} / {model} {len(group)}件 ({batch_id})")
+        batches.append(batch)
+
+    results = {}
+    deadline = time.monotonic() + float(_settings["max_wait_hours"]) * 3600
+    waiting = list(batches)
+    while waiting:
+        for batch in list(waiting):
+            # 一時的なエラー（5xx・接続断）では諦めない。送信済みのバッチは完了するか期限まで待つ
+            try:
+                if not batch.done():
+                    continue
+                results.update(batch.results())
+            except Exception as e:
+                print(f"  ⚠️  バッチの確認に失敗（次のポーリングで再試行）: {e}")
+                continue
+            waiting.remove(batch)
+        if not waiting:
+            break
+        if time.monotonic() >= deadline:
+            print(f"  ⚠️  {len(waiting)}件のバッチが {_settings['max_wait_hours']}時間以内に終わりませんでした（通常の呼び出しで続行）")
+            break
+        time.sleep(_settings["poll_interval_sec"])
+
+    print(f"  └─ {label} バッチ完了: {len(results)}/{len(requests)}件")
+    return results
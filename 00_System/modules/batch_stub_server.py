@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+バッチAPIのローカル代替サーバー（ネットワーク・APIキーなしで --batch-api を試す用）
+Anthropic Message Batches と Gemini Batch Mode のエンドポイントだけを実装し、
+プロンプトの種類に応じた定型の応答を返す（構成プランはJSON、セクション本文は見出し付きのMarkdown）
+
+使い方:
+    python -m modules.batch_stub_server --port 8765 --delay-sec 2
+    # 設定ファイル: "batch_api": {"anthropic_base_url": "http://127.0.0.1:8765", "gemini_base_url": "http://127.0.0.1:8765"}
+"""
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+
+
+# 構成プラン（Phase 3）の定型応答
+STRUCTURE_RESPONSE = {
+    "free_sections": [
+        {"title": "はじめに", "purpose": "読者の悩みに共感する", "chars": "600-800",
+         "images": [{"filename": "banner_intro.png", "type": "バナー", "description": "導入バナー", "position": "前"}]},
+        {"title": "なぜ今始めるべきか", "purpose": "有料パートへ誘導する", "chars": "600-800", "images": []},
+    ],
+    "paid_sections": [
+        {"title": "STEP 1: 準備", "purpose": "最初にやることを示す", "chars": "800-1000",
+         "images": [{"filename": "ill_step1.png", "type": "イラスト", "description": "準備の流れ", "position": "後"}]},
+        {"title": "STEP 2: 実践", "purpose": "具体的な手順を示す", "chars": "800-1000", "images": []},
+    ],
+    "bonus_section": {"title": "購入者限定追加特典", "purpose": "LINE登録誘導", "chars": "500-700", "images": []},
+}
+
+SECTION_NAME_PATTERN = re.compile(r"【セクション名】\s*\n(.+)")
+
+
+def respond(prompt, system=None):
+    """プロンプトの種類に応じた定型の応答"""
+    if "JSONのみを出力" in prompt:
+        return "```json\n" + json.dumps(STRUCTURE_RESPONSE, ensure_ascii=False, indent=2) + "\n```"
+    match = SECTION_NAME_PATTERN.search(prompt)
+    if match:
+        section_name = match.group(1).strip()
+        return f"## {section_name}\n\nこれはバッチAPIの代替サーバーが返した「{section_name}」の本文です。\n\n### ポイント\n- 要点1\n- 要点2\n"
+    first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+    return f"# 代替サーバーの応答\n\n{first_line}\n\n- 項目1\n- 項目2\n"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(value):
+    return value.isoformat().replace("+00:00", "Z") if value else None
+
+
+def _text_of(parts):
+    return "".join(part.get("text", "") for part in parts or [])
+
+
+class StubState:
+    """受け付けたバッチ（作成から delay_sec 後に完了扱い）"""
+
+    def __init__(self, delay_sec=0, fail_every=0):
+        self.delay_sec = delay_sec
+        self.fail_every = fail_every
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.request_count = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, kind, items):
+        with self.lock:
+            batch_id = f"{kind}_{next(self.ids):04d}"
+            self.batches[batch_id] = {"created_at": _now(), "items": items}
+        return batch_id
+
+    def get(self, batch_id):
+        with self.lock:
+            return self.batches.get(batch_id)
+
+    def is_ended(self, batch):
+        return (_now() - batch["created_at"]).total_seconds() >= self.delay_sec
+
+    def should_fail(self):
+        # fail_every件ごとに1件を失敗させる（通常の呼び出しへのフォールバック確認用）
+        return bool(self.fail_every) and next(self.request_count) % self.fail_every == 0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("content-length") or 0)
+            return json.loads(self.rfile.read(length).decode("utf-8")) if length else {}
+
+        def _base_url(self):
+            return f"http://{self.headers.get('host')}"
+
+        # --- Anthropic Message Batches ---
+
+        def _anthropic_batch(self, batch_id, batch):
+            ended = state.is_ended(batch)
+            succeeded = sum(1 for item in batch["items"] if item["ok"])
+            return {
+                "id": batch_id,
+                "type": "message_batch",
+                "processing_status": "ended" if ended else "in_progress",
+                "request_counts": {
+                    "processing": 0 if ended else len(batch["items"]),
+                    "succeeded": succeeded if ended else 0,
+                    "errored": len(batch["items"]) - succeeded if ended else 0,
+                    "canceled": 0,
+                    "expired": 0,
+                },
+                "created_at": _iso(batch["created_at"]),
+                "expires_at": _iso(batch["created_at"] + timedelta(hours=24)),
+                "ended_at": _iso(_now()) if ended else None,
+                "archived_at": None,
+                "cancel_initiated_at": None,
+                "results_url": f"{self._base_url()}/v1/messages/batches/{batch_id}/results" if ended else None,
+            }
+
+        def _anthropic_create(self):
+            items = []
+            for request in self._body().get("requests", []):
+                params = request["params"]
+                system = _text_of(params.get("system")) if isinstance(params.get("system"), list) else params.get("system")
+                content = params["messages"][-1]["content"]
+                prompt = content if isinstance(content, str) else _text_of(content)
+                items.append({
+                    "custom_id": request["custom_id"],
+                    "model": params["model"],
+                    "text": respond(prompt, system),
+                    "input_tokens": len(prompt) + len(system or ""),
+                    "ok": not state.should_fail(),
+                })
+            batch_id = state.add("msgbatch", items)
+            self._send(200, self._anthropic_batch(batch_id, state.get(batch_id)))
+
+        def _anthropic_results(self, batch):
+            lines = []
+            for i, item in enumerate(batch["items"]):
+                if item["ok"]:
+                    result = {"type": "succeeded", "message": {
+                        "id": f"msg_stub_{i}", "type": "message", "role": "assistant", "model": item["model"],
+                        "content": [{"type": "text", "text": item["text"]}],
+                        "stop_reason": "end_turn", "stop_sequence": None,
+                        "usage": {"input_tokens": item["input_tokens"], "output_tokens": len(item["text"]),
+                                  "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0},
+                    }}
+                else:
+                    result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": "stub failure"}}}
+                lines.append(json.dumps({"custom_id": item["custom_id"], "result": result}, ensure_ascii=False))
+            self._send(200, ("\n".join(lines) + "\n").encode("utf-8"), "application/binary")
+
+        # --- Gemini Batch Mode ---
+
+        def _gemini_batch(self, name, batch):
+            ended = state.is_ended(batch)
+            metadata = {
+                "name": name,
+                "model": batch["model"],
+                "state": "BATCH_STATE_SUCCEEDED" if ended else "BATCH_STATE_RUNNING",
+                "createTime": _iso(batch["created_at"]),
+            }
+            if ended:
+                metadata["endTime"] = _iso(_now())
+                metadata["output"] = {"inlinedResponses": {"inlinedResponses": [
+                    {"response": {"candidates": [{"content": {"role": "model", "parts": [{"text": item["text"]}]},
+                                                  "finishReason": "STOP"}]}}
+                    if item["ok"] else {"error": {"code": 500, "message": "stub failure"}}
+                    for item in batch["items"]
+                ]}}
+            return {"name": name, "metadata": metadata, "done": ended}
+
+        def _gemini_create(self, model):
+            body = self._body().get("batch", {})
+            items = []
+            for entry in body.get("inputConfig", {}).get("requests", {}).get("requests", []):
+                request = entry.get("request", {})
+                prompt = "".join(_text_of(content.get("parts")) for content in request.get("contents", []))
+                system = _text_of((request.get("systemInstruction") or {}).get("parts"))
+                items.append({"text": respond(prompt, system), "ok": not state.should_fail()})
+            batch_id = state.add("stub", items)
+            batch = state.get(batch_id)
+            batch["model"] = f"models/{model}"
+            self._send(200, self._gemini_batch(f"batches/{batch_id}", batch))
+
+        # --- ルーティング ---
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path == "/v1/messages/batches":
+                return self._anthropic_create()
+            match = re.fullmatch(r"/v1beta/models/(.+):batchGenerateContent", path)
+            if match:
+                return self._gemini_create(match.group(1))
+            self._send(404, {"error": {"message": f"not found: {path}"}})
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            match = re.fullmatch(r"/v1/messages/batches/([^/]+)(/results)?", path)
+            if match and state.get(match.group(1)):
+                batch = state.get(match.group(1))
+                if match.group(2):
+                    return self._anthropic_results(batch)
+                return self._send(200, self._anthropic_batch(match.group(1), batch))
+            match = re.fullmatch(r"/v1beta/batches/([^/]+)", path)
+            if match and state.get(match.group(1)):
+                return self._send(200, self._gemini_batch(f"batches/{match.group(1)}", state.get(match.group(1))))
+            self._send(404, {"error": {"message": f"not found: {path}"}})
+
+    return Handler
+
+
+def start(port=0, delay_sec=0, fail_every=0):
+    """
+    別スレッドでサーバーを起動
+
+    Returns:
+        (server, base_url)。止めるときは server.shutdown()
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StubState(delay_sec, fail_every)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="バッチAPIのローカル代替サーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-sec", type=float, default=2.0, help="バッチが完了扱いになるまでの秒数")
+    parser.add_argument("--fail-every", type=int, default=0, help="N件ごとに1件を失敗させる（0なら失敗なし）")
+    args = parser.parse_args()
+
+    server, base_url = start(args.port, args.delay_sec, args.fail_every)
+    print(f"🧪 バッチAPI代替サーバー: {base_url}（Ctrl+Cで終了）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+チェックポイント & 再開
+フェーズごとの入力ハッシュ・出力ハッシュをプロジェクト内のマニフェストに記録し、
+入力が変わっていないフェーズを --resume でスキップする
+"""
+
+from pathlib import Path
+from datetime import datetime
+import hashlib
+import json
+
+
+MANIFEST_NAME = "manifest.json"
+
+# 各フェーズが参照する設定キー（値が変われば再実行）
+PHASE_CONFIG_KEYS = {
+    1: ["prefer_gemini_for_text"],
+    2: ["youtube_keyword", "theme_keywords", "max_youtube_videos", "search_overfetch", "transcript_token_budget",
+        "knowhow_mode", "map_chunk_tokens", "prefer_gemini_for_text"],
+    3: ["prefer_gemini_for_text"],
+    4: ["enable_text_generation", "enable_image_generation", "prefer_gemini_for_text",
+        "knowhow_top_k", "knowhow_token_budget"],
+    5: [],
+    6: ["enable_drive_upload", "google_drive_folder_id"],
+}
+
+# 再開時のコスト集計に含めないキー（スキップしたフェーズは今回0円）
+TOKEN_KEYS = ("input_tokens", "output_tokens", "total_input_tokens", "total_output_tokens",
+              "cache_creation_input_tokens", "cache_read_input_tokens", "map_input_tokens", "map_output_tokens")
+
+
+def phase_input_files(phase, project_dir):
+    """フェーズが読み込むファイル"""
+    research = project_dir / "01_Research"
+    planning = project_dir / "02_Planning"
+    if phase == 1:
+        return []
+    if phase == 2:
+        return [research / "concept_definition.md"]
+    if phase == 3:
+        return [research / "concept_definition.md", research / "knowhow_extraction.md"]
+    if phase == 4:
+        return [
+            research / "concept_definition.md",
+            research / "knowhow_extraction.md",
+            planning / "structure_plan.md",
+        ]
+    if phase == 5:
+        return (
+            sorted((project_dir / "03_Content_Draft").glob("*.md"))
+            + sorted((project_dir / "04_Images").glob("*/*.png"))
+            + [planning / "structure_plan.md"]
+        )
+    if phase == 6:
+        return sorted((project_dir / "05_Final").glob("*"))
+    return []
+
+
+def phase_output_files(phase, project_dir, config=None):
+    """
+    フェーズが書き出すファイル
+
+    Phase 4は構成プランから決まる本文・画像（config の enable_text_generation / enable_image_generation に従う）と、
+    実際にあるファイルの両方。生成に失敗したファイルは存在しないので、再開時にPhase 4が再実行される
+    """
+    if phase == 1:
+        return [project_dir / "01_Research" / "concept_definition.md"]
+    if phase == 2:
+        return [project_dir / "01_Research" / "knowhow_extraction.md"]
+    if phase == 3:
+        return [project_dir / "02_Planning" / "structure_plan.md"]
+    if phase == 4:
+        from . import phase4_writing  # Phase 4を再開するときだけ読み込む
+
+        config = config or {}
+        planned = phase4_writing.planned_outputs(
+            project_dir,
+            enable_text_generation=config.get("enable_text_generation", True),
+            enable_image_generation=config.get("enable_image_generation", True),
+        )
+        existing = sorted((project_dir / "03_Content_Draft").glob("*.md")) + sorted((project_dir / "04_Images").glob("*/*.png"))
+        return [project_dir / "02_Planning" / "visual_map.md"] + sorted(set(planned) | set(existing))
+    if phase == 5:
+        final_dir = project_dir / "05_Final"
+        return [final_dir / name for name in ("final_article.md", "final_article.html", "images.zip", "metadata.json")]
+    return []
+
+
+def hash_files(paths, base_dir):
+    """ファイル群の内容ハッシュ（存在しないファイルも区別する）"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(Path(path).relative_to(base_dir)).encode("utf-8"))
+        if Path(path).exists():
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        else:
+            digest.update(b"\0missing")
+    return digest.hexdigest()
+
+
+def phase_input_hash(phase, project_dir, theme, target, config):
+    """フェーズの入力（ファイル + テーマ + 関連設定）のハッシュ"""
+    params = {key: config.get(key) for key in PHASE_CONFIG_KEYS.get(phase, [])}
+    params["phase"] = phase
+    if phase in (1, 6):
+        params["theme"] = theme
+    if phase == 1:
+        params["target"] = target
+    digest = hashlib.sha256(json.dumps(params, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    digest.update(hash_files(phase_input_files(phase, project_dir), project_dir).encode("ascii"))
+    return digest.hexdigest()
+
+
+class Manifest:
+    """プロジェクトごとの実行記録（project_dir/manifest.json）"""
+
+    def __init__(self, project_dir, config=None):
+        self.project_dir = Path(project_dir)
+        self.config = config or {}
+        self.path = self.project_dir / MANIFEST_NAME
+        self.data = {"phases": {}}
+        if self.path.exists():
+            try:
+                self.data = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError:
+                print(f"  ⚠️  {MANIFEST_NAME} が壊れているため作り直します")
+        self.data.setdefault("phases", {})
+
+    def is_fresh(self, phase, input_hash):
+        """前回と入力が同じで、出力ファイルも書き換えられていないか"""
+        entry = self.data["phases"].get(str(phase))
+        if not entry or entry.get("input_hash") != input_hash:
+            return False
+        outputs = phase_output_files(phase, self.project_dir, self.config)
+        if any(not path.exists() for path in outputs):
+            return False
+        return entry.get("output_hash") == hash_files(outputs, self.project_dir)
+
+    def cached_result(self, phase):
+        """前回の戻り値（トークン数は除く）"""
+        entry = self.data["phases"].get(str(phase), {})
+        return {k: v for k, v in entry.get("result", {}).items() if k not in TOKEN_KEYS}
+
+    def record(self, phase, input_hash, result):
+        """フェーズ完了を記録して保存"""
+        outputs = phase_output_files(phase, self.project_dir, self.config)
+        self.data["phases"][str(phase)] = {
+            "input_hash": input_hash,
+            "output_hash": hash_files(outputs, self.project_dir),
+            "completed_at": datetime.now().isoformat(),
+            "result": result,
+        }
+        self.save()
+
+    def save(self):
+        self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
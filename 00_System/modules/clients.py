@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+APIクライアントレジストリ
+各クライアントは初めて使われたときに1度だけ作り、プロセス内でHTTP接続プールを共有する
+（batch_runner --in-process で複数テーマを処理するときもTLSハンドシェイクを省ける）
+"""
+
+import threading
+
+from . import startup_profile
+
+
+# 設定ファイルの http_client で上書き可能
+DEFAULT_HTTP_SETTINGS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry_sec": 60,
+    "timeout_sec": 300,
+}
+
+_http = dict(DEFAULT_HTTP_SETTINGS)
+_clients = {}
+_lock = threading.Lock()
+
+
+def configure(settings=None):
+    """接続プール・タイムアウト設定を反映（作成済みのクライアントは破棄）"""
+    global _http
+    with _lock:
+        _http = dict(DEFAULT_HTTP_SETTINGS)
+        _http.update(settings or {})
+        _clients.clear()
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_claude_client(api_key, base_url=None):
+    """Claudeクライアント（APIキー・接続先ごとに1つ。base_url はバッチAPIの代替サーバーなど）"""
+    def create():
+        anthropic = startup_profile.timed_import("anthropic")
+        # SDKが内部で使うhttpx実装のLimitsを使う
+        limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=_http["max_connections"],
+            max_keepalive_connections=_http["max_keepalive_connections"],
+            keepalive_expiry=_http["keepalive_expiry_sec"],
+        )
+        return anthropic.Anthropic(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=_http["timeout_sec"],
+            http_client=anthropic.DefaultHttpxClient(limits=limits, timeout=_http["timeout_sec"]),
+        )
+
+    return _get_or_create(("claude", api_key, base_url), create)
+
+
+def get_gemini_client(api_key, api_version="v1", base_url=None):
+    """Geminiクライアント（APIキー・APIバージョン・接続先ごとに1つ。バッチはv1beta）"""
+    def create():
+        httpx = startup_profile.timed_import("httpx")
+        genai = startup_profile.timed_import("google.genai")
+        types = startup_profile.timed_import("google.genai.types")
+
+        limits = httpx.Limits(
+            max_connections=_http["max_connections"],
+            max_keepalive_connections=_http["max_keepalive_connections"],
+            keepalive_expiry=_http["keepalive_expiry_sec"],
+        )
+        http_options = types.HttpOptions(
+            api_version=api_version,
+            base_url=base_url,
+            timeout=int(_http["timeout_sec"] * 1000),  # ミリ秒
+            client_args={"limits": limits},
+        )
+        return genai.Client(api_key=api_key, http_options=http_options)
+
+    return _get_or_create(("gemini", api_key, api_version, base_url), create)
+
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+APIキー読み込み
+環境変数 → 設定ファイルの env_file → 従来の.envパスの順に探し、結果をプロセス内でキャッシュする
+"""
+
+from pathlib import Path
+import importlib.util
+import json
+import os
+import threading
+
+
+# 設定ファイルに env_file がない場合も従来どおり探す.env
+LEGACY_ENV_PATHS = [
+    Path("/Users/keigo/001_cursor/.env"),
+    Path("/Users/keigo/001_cursor/文字起こしブースター/mioji_share_v2/.env"),
+]
+
+# プロバイダごとの環境変数名（先にあるものを優先）
+PROVIDER_ENV_VARS = {
+    "claude": ["ANTHROPIC_API_KEY"],
+    "gemini": ["GEMINI_API_KEY", "GOOGLE_API_KEY"],
+}
+
+# プロバイダごとのSDK（importできるかだけを確認）
+PROVIDER_SDKS = {
+    "claude": "anthropic",
+    "gemini": "google.genai",
+}
+
+_env_paths = list(LEGACY_ENV_PATHS)
+_env_files = {}
+_keys = {}
+_lock = threading.Lock()
+
+
+def configure(env_file=None):
+    """
+    .envの探索パスを設定（キャッシュはクリア）
+
+    Args:
+        env_file: 設定ファイルの env_file（パス文字列またはそのリスト）
+    """
+    global _env_paths
+    if isinstance(env_file, str):
+        env_file = [env_file]
+    with _lock:
+        _env_paths = [Path(p).expanduser() for p in (env_file or [])] + list(LEGACY_ENV_PATHS)
+        _env_files.clear()
+        _keys.clear()
+
+
+def _read_env_file(path):
+    """.envファイルを1度だけ読んでdictにする"""
+    if path not in _env_files:
+        values = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#") and "=" in line:
+                        key, value = line.split("=", 1)
+                        values[key.strip()] = value.strip().strip('"').strip("'").strip()
+        except OSError:
+            pass
+        _env_files[path] = values
+    return _env_files[path]
+
+
+def _resolve(provider):
+    """(APIキー, 取得元) を返す"""
+    names = PROVIDER_ENV_VARS[provider]
+    for name in names:
+        value = os.environ.get(name, "").strip()
+        if value:
+            return value, f"env:{name}"
+    for path in _env_paths:
+        if not path.exists():
+            continue
+        values = _read_env_file(path)
+        for name in names:
+            if values.get(name):
+                return values[name], f"file:{path}"
+    return None, None
+
+
+def get_api_key(provider):
+    """プロバイダのAPIキー（見つからなければNone）"""
+    with _lock:
+        if provider not in _keys:
+            _keys[provider] = _resolve(provider)
+        return _keys[provider][0]
+
+
+def get_claude_api_key():
+    return get_api_key("claude")
+
+
+def get_gemini_api_key():
+    return get_api_key("gemini")
+
+
+def sdk_available(provider):
+    """プロバイダのSDKがインストールされているか（importはしない）"""
+    try:
+        return importlib.util.find_spec(PROVIDER_SDKS[provider]) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def report():
+    """利用可能なプロバイダを1行で表示"""
+    status = {}
+    for provider in PROVIDER_ENV_VARS:
+        key = get_api_key(provider)
+        status[provider] = {
+            "usable": bool(key) and sdk_available(provider),
+            "key": _keys[provider][1] or "missing",
+            "sdk": sdk_available(provider),
+        }
+    print(f"🔑 credentials {json.dumps(status, ensure_ascii=False)}")
+    return status
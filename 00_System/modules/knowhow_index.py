@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+ノウハウ検索（BM25）
+knowhow_extraction.md を見出し・段落単位のチャンクに分けてローカルで索引し、
+セクションのタイトル・目的に関連するチャンクだけをトークン予算内で取り出す
+日本語は分かち書きせず文字bigram、英数字は単語で索引する（外部サービス・追加ライブラリなし）
+"""
+
+import math
+import re
+from collections import Counter
+
+from .transcript_text import estimate_tokens
+
+
+K1 = 1.5
+B = 0.75
+
+# 1チャンクの上限（これを超える段落は行単位で分ける）
+MAX_CHUNK_TOKENS = 400
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+NON_TEXT_PATTERN = re.compile(r"[\s\W_]+")
+
+
+def split_chunks(markdown):
+    """
+    見出し・空行でチャンクに分ける
+
+    Returns:
+        [{"heading": 見出しの階層, "text": 本文}]（文書順）
+    """
+    chunks = []
+    headings = []
+    lines = []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        lines.clear()
+        if not body:
+            return
+        heading = " > ".join(headings)
+        # 表や長い箇条書きは行ごとにまとめ直して上限に収める
+        part = []
+        for line in body.split("\n"):
+            if part and estimate_tokens("\n".join(part + [line])) > MAX_CHUNK_TOKENS:
+                chunks.append({"heading": heading, "text": "\n".join(part)})
+                part = []
+            part.append(line)
+        if part:
+            chunks.append({"heading": heading, "text": "\n".join(part)})
+
+    for line in markdown.splitlines():
+        match = HEADING_PATTERN.match(line.strip())
+        if match:
+            flush()
+            level = len(match.group(1))
+            headings[:] = headings[:level - 1] + [match.group(2).strip()]
+            continue
+        if not line.strip():
+            flush()
+            continue
+        lines.append(line)
+    flush()
+    return chunks
+
+
+def tokenize(text):
+    """英数字は単語、それ以外は文字bigram"""
+    text = text.lower()
+    terms = WORD_PATTERN.findall(text)
+    rest = NON_TEXT_PATTERN.sub(" ", WORD_PATTERN.sub(" ", text))
+    for run in rest.split():
+        if len(run) == 1:
+            terms.append(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class KnowhowIndex:
+    """knowhow_extraction.md のBM25索引"""
+
+    def __init__(self, markdown, top_k=5, token_budget=1500):
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.chunks = split_chunks(markdown)
+        # 見出しも検索対象に含める（本文に出てこない語でセクションと結び付くことが多い）
+        self.docs = [Counter(tokenize(f"{chunk['heading']} {chunk['text']}")) for chunk in self.chunks]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        df = Counter(term for doc in self.docs for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def score(self, query):
+        """各チャンクのBM25スコア"""
+        terms = set(tokenize(query))
+        scores = []
+        for doc, length in zip(self.docs, self.lengths):
+            total = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if not tf:
+                    continue
+                norm = K1 * (1 - B + B * length / self.avg_length)
+                total += self.idf[term] * tf * (K1 + 1) / (tf + norm)
+            scores.append(total)
+        return scores
+
+    def select(self, query):
+        """
+        クエリに関連する上位 top_k チャンクを予算内で選び、文書順に並べたMarkdownを返す
+        （何もヒットしなければ先頭から予算分）
+        """
+        scores = self.score(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        if not ranked:
+            ranked = list(range(len(self.chunks)))
+
+        picked = []
+        used = 0
+        for i in ranked:
+            if len(picked) >= self.top_k:
+                break
+            cost = estimate_tokens(self.chunks[i]["heading"]) + estimate_tokens(self.chunks[i]["text"])
+            if picked and used + cost > self.token_budget:
+                continue
+            picked.append(i)
+            used += cost
+
+        parts = []
+        for i in sorted(picked):
+            chunk = self.chunks[i]
+            parts.append(f"### {chunk['heading']}\n{chunk['text']}" if chunk["heading"] else chunk["text"])
+        return "\n\n".join(parts)
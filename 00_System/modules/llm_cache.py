@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+LLMレスポンスキャッシュ
+プロバイダ・モデル・プロンプト・パラメータのハッシュをキーにディスクへ保存し、
+同じテーマの再実行やリトライで同一リクエストを二重に支払わないようにする
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "brain_content_system" / "llm"
+
+# 設定ファイルの llm_cache で上書き可能
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "dir": str(DEFAULT_CACHE_DIR),
+    "ttl_hours": 24 * 7,
+    "max_mb": 512,
+}
+
+# 書き込みN回ごとにサイズ上限をチェック
+EVICT_EVERY_WRITES = 50
+
+_settings = dict(DEFAULT_SETTINGS)
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def configure(settings=None, bypass=False):
+    """
+    キャッシュ設定を反映
+
+    Args:
+        settings: {"enabled": bool, "dir": str, "ttl_hours": float, "max_mb": float}
+        bypass: Trueならキャッシュを読まず書かない（--no-cache）
+    """
+    global _settings
+    with _lock:
+        _settings = dict(DEFAULT_SETTINGS)
+        _settings.update(settings or {})
+        if bypass:
+            _settings["enabled"] = False
+    if _settings["enabled"]:
+        evict()
+
+
+def is_enabled():
+    return bool(_settings.get("enabled"))
+
+
+def cache_dir():
+    return Path(_settings["dir"]).expanduser()
+
+
+def make_key(provider, model, prompt, params=None):
+    """リクエスト内容からキャッシュキー（SHA-256）を生成"""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "prompt": prompt, "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return cache_dir() / key[:2] / f"{key}.json"
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def get(provider, model, prompt, params=None):
+    """キャッシュ済みのレスポンスを返す（なければNone）"""
+    if not is_enabled():
+        return None
+
+    path = _entry_path(make_key(provider, model, prompt, params))
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        _count("misses")
+        return None
+
+    ttl_sec = float(_settings.get("ttl_hours") or 0) * 3600
+    if ttl_sec and time.time() - entry.get("created_at", 0) > ttl_sec:
+        path.unlink(missing_ok=True)
+        _count("misses")
+        _count("evictions")
+        return None
+
+    # 最近使ったエントリを残すためアクセス時刻だけ進める（mtimeは作成時刻のまま）
+    try:
+        os.utime(path, (time.time(), path.stat().st_mtime))
+    except OSError:
+        pass
+    _count("hits")
+    return entry.get("value")
+
+
+def put(provider, model, prompt, value, params=None):
+    """レスポンスを保存（valueはJSON化できるdict）"""
+    if not is_enabled():
+        return
+
+    path = _entry_path(make_key(provider, model, prompt, params))
+    entry = {
+        "created_at": time.time(),
+        "provider": provider,
+        "model": model,
+        "value": value,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"    ⚠️  キャッシュ書き込み失敗: {e}")
+        return
+
+    _count("writes")
+    if _stats["writes"] % EVICT_EVERY_WRITES == 0:
+        evict()
+
+
+def evict():
+    """期限切れのエントリを削除し、上限サイズを超えた分を最終アクセスの古い順に削除"""
+    root = cache_dir()
+    if not root.exists():
+        return 0
+
+    now = time.time()
+    ttl_sec = float(_settings.get("ttl_hours") or 0) * 3600
+    max_bytes = float(_settings.get("max_mb") or 0) * 1024 * 1024
+
+    entries = []
+    removed = 0
+    for path in root.glob("*/*.json"):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        if ttl_sec and now - st.st_mtime > ttl_sec:
+            path.unlink(missing_ok=True)
+            removed += 1
+            continue
+        entries.append((st.st_atime, st.st_size, path))
+
+    if max_bytes:
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+    if removed:
+        _count("evictions", removed)
+    return removed
+
+
+def stats():
+    """ヒット/ミスなどのカウンタ"""
+    with _lock:
+        return dict(_stats)
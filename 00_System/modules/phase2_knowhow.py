@@ -5,142 +5,29 @@ YouTubeから動画を検索し、字幕からノウハウを抽出
 """
 
 from pathlib import Path
-import anthropic
-import os
-import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import contextvars
+import hashlib
 import json
-import re
-import tempfile
-
-# Gemini API
-try:
-    from google import genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-
-
-def load_claude_api_key():
-    """Claude APIキーを読み込む"""
-    api_key = os.environ.get('ANTHROPIC_API_KEY')
-    if api_key:
-        return api_key.strip()
-    
-    env_paths = [
-        Path("/Users/keigo/001_cursor/.env"),
-        Path("/Users/keigo/001_cursor/文字起こしブースター/mioji_share_v2/.env"),
-    ]
-    
-    for env_path in env_paths:
-        if env_path.exists():
-            try:
-                with open(env_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith("#") and "=" in line:
-                            key, value = line.split("=", 1)
-                            key = key.strip()
-                            value = value.strip().strip('"').strip("'")
-                            if key == "ANTHROPIC_API_KEY":
-                                return value.strip()
-            except Exception:
-                continue
-    
-    return None
+import time
 
-
-def load_gemini_api_key():
-    """Gemini APIキーを読み込む"""
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if api_key:
-        return api_key.strip()
-    
-    env_paths = [
-        Path("/Users/keigo/001_cursor/.env"),
-        Path("/Users/keigo/001_cursor/文字起こしブースター/mioji_share_v2/.env"),
-    ]
-    
-    for env_path in env_paths:
-        if env_path.exists():
-            try:
-                with open(env_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith("#") and "=" in line:
-                            key, value = line.split("=", 1)
-                            key = key.strip()
-                            value = value.strip().strip('"').strip("'")
-                            if key == "GEMINI_API_KEY":
-                                return value.strip()
-            except Exception:
-                continue
-    
-    return None
+from . import text_generation, transcript_text, youtube_backend, youtube_store
 
 
-def search_youtube_videos(keyword, max_results=5):
-    """YouTubeで動画を検索（yt-dlp使用）"""
+def search_youtube_videos(keyword, max_results=5, backend=None):
+    """YouTubeで動画を検索（yt-dlp使用。結果はTTL付きでキャッシュ）"""
+    cached = youtube_store.get_search(keyword, max_results)
+    if cached:
+        print("    📦 検索キャッシュを使用")
+        return cached
+    
     try:
-        # yt-dlpで検索
-        search_query = f"ytsearch{max_results}:{keyword}"
-        
-        # yt-dlpのパスを探す
-        ytdlp_paths = [
-            "/Users/keigo/Library/Python/3.12/bin/yt-dlp",
-            "/usr/local/bin/yt-dlp",
-            "yt-dlp"  # PATHにある場合
-        ]
-        
-        ytdlp_cmd = None
-        for path in ytdlp_paths:
-            try:
-                result_check = subprocess.run([path, "--version"], capture_output=True, timeout=5)
-                if result_check.returncode == 0:
-                    ytdlp_cmd = path
-                    break
-            except:
-                continue
-        
-        if not ytdlp_cmd:
+        backend = backend or youtube_backend.get_backend()
+        if not backend:
             print("    ❌ yt-dlpが見つかりません")
             return []
-        
-        cmd = [
-            ytdlp_cmd,
-            "--dump-json",
-            "--skip-download",
-            "--no-warnings",
-            search_query
-        ]
-        
-        # コマンド実行
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        if result.returncode != 0:
-            print(f"    ❌ 検索エラー: {result.stderr}")
-            return []
-        
-        # 結果を解析
-        videos = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                try:
-                    video_data = json.loads(line)
-                    videos.append({
-                        'title': video_data.get('title', ''),
-                        'id': video_data.get('id', ''),
-                        'link': f"https://www.youtube.com/watch?v={video_data.get('id', '')}",
-                        'duration': str(video_data.get('duration', 0)),
-                        'views': str(video_data.get('view_count', 'N/A'))
-                    })
-                except:
-                    continue
-        
+        videos = backend.search(keyword, max_results)
+        youtube_store.put_search(keyword, max_results, videos)
         return videos
     
     except Exception as e:
@@ -148,143 +35,165 @@ def search_youtube_videos(keyword, max_results=5):
         return []
 
 
-def get_video_transcript(video_id, ytdlp_cmd):
-    """動画の字幕を取得（yt-dlp使用）"""
+def get_video_transcript(video_id, backend):
+    """動画の字幕を取得（yt-dlp使用。取得できた字幕はストアに保存）"""
     try:
-        # 一時ディレクトリで字幕をダウンロード
-        with tempfile.TemporaryDirectory() as tmpdir:
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            cmd = [
-                ytdlp_cmd,
-                "--write-auto-sub",
-                "--sub-lang", "ja",
-                "--skip-download",
-                "--sub-format", "json3",
-                "-o", f"{tmpdir}/subtitle",
-                "--no-warnings",
-                video_url
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            # 字幕ファイルを探す
-            subtitle_files = list(Path(tmpdir).glob("*.ja.json3"))
-            
-            if not subtitle_files:
-                return None
-            
-            # 字幕を読み込んで解析
-            subtitle_file = subtitle_files[0]
-            with open(subtitle_file, 'r', encoding='utf-8') as f:
-                subtitle_data = json.load(f)
-            
-            # テキストを抽出
-            if 'events' in subtitle_data:
-                texts = []
-                for event in subtitle_data['events']:
-                    if 'segs' in event:
-                        for seg in event['segs']:
-                            if 'utf8' in seg:
-                                texts.append(seg['utf8'])
-                
-                full_text = " ".join(texts)
-                return full_text
-            
-            return None
+        transcript = backend.transcript(video_id)
+        # 締め切り後に届いた字幕も次回のために保存しておく
+        youtube_store.put_transcript(video_id, youtube_backend.SUBTITLE_LANG, transcript)
+        return transcript
     
     except Exception as e:
         print(f"    ⚠️  字幕取得失敗: {str(e)[:100]}...")
         return None
 
 
-def extract_knowhow_with_claude(video_data_list, concept_content, claude_client):
-    """Claude APIでノウハウを抽出"""
-    # 動画情報をまとめる
-    videos_summary = ""
-    for i, video in enumerate(video_data_list, 1):
-        videos_summary += f"\n\n【動画{i}】\nタイトル: {video['title']}\n再生回数: {video['views']}\n\n字幕:\n{video['transcript'][:3000]}...\n"
-    
-    prompt = f"""あなたはプロのコンテンツリサーチャーです。以下のYouTube動画の字幕から、実践的なノウハウとテクニックを抽出してください。
-
-【コンセプト】
-{concept_content}
-
-【YouTube動画の字幕】
-{videos_summary}
-
-【タスク】
-以下のフォーマットでノウハウを抽出してください：
+def fetch_transcripts(videos, backend, workers=3, deadline=None, max_videos=None):
+    """
+    字幕を並列取得（ストアにある動画はダウンロードしない。締め切りまでに届いた分だけ返す）
 
-# ノウハウ抽出
+    検索結果の字幕情報で日本語字幕がないと分かっている動画はスキップし、
+    max_videos 件そろった時点で残りの候補は取得しない
 
-## 主要ノウハウマトリクス
+    Args:
+        videos: search_youtube_videos の戻り値（検索順。max_videos より多めに渡す）
+        backend: youtube_backend.get_backend() の戻り値
+        workers: 同時に取得する本数
+        deadline: time.monotonic() 基準の締め切り（Noneなら全件待つ）
+        max_videos: 必要な字幕の本数（Noneなら全候補）
 
-| 項目 | 動画1 | 動画2 | 動画3 | 採用ノウハウ |
-|------|-------|-------|-------|------------|
-| 基本戦略 | ... | ... | ... | ... |
-| 収益化手法 | ... | ... | ... | ... |
-| プロフィール設計 | ... | ... | ... | ... |
-| 投稿戦略 | ... | ... | ... | ... |
-| AI活用法 | ... | ... | ... | ... |
-
-## 実践テクニック
-
-### 1. [テクニック名]
-- 具体的な手順
-- ポイント
-- 注意点
-
-### 2. [テクニック名]
-...
+    Returns:
+        (video_data_list, timed_out, from_store): 取得できた字幕（検索順）、締め切りで打ち切った本数、ストアから読んだ本数
+    """
+    total = len(videos)
+    wanted = max_videos or total
+    results = {}
+    candidates = []
+    for i, video in enumerate(videos, 1):
+        if video.get('has_captions') is False:
+            print(f"  │  ├─ [{i}/{total}] ⏭️  日本語字幕なし: {video['title'][:50]}...")
+            continue
+        if len(results) < wanted:
+            stored = youtube_store.get_transcript(video['id'], youtube_backend.SUBTITLE_LANG)
+            if stored:
+                results[i] = {
+                    'title': video['title'],
+                    'views': video['views'],
+                    'transcript': stored
+                }
+                print(f"  │  ├─ [{i}/{total}] 📦 ストア: {video['title'][:50]}... ({len(stored)}文字)")
+                continue
+        candidates.append((i, video))
+    from_store = len(results)
+    
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {}
+    
+    def submit_next():
+        # 取得中 + 取得済みが必要数に満たない分だけ次の候補を投入
+        while candidates and len(results) + len(futures) < wanted:
+            i, video = candidates.pop(0)
+            # copy_context: batch_runner --in-process のテーマ別ログ出力先をワーカースレッドにも引き継ぐ
+            future = pool.submit(contextvars.copy_context().run, get_video_transcript, video['id'], backend)
+            futures[future] = (i, video)
+    
+    submit_next()
+    while futures:
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            i, video = futures.pop(future)
+            transcript = future.result()
+            if transcript:
+                results[i] = {
+                    'title': video['title'],
+                    'views': video['views'],
+                    'transcript': transcript
+                }
+                print(f"  │  ├─ [{i}/{total}] ✅ {video['title'][:50]}... ({len(transcript)}文字)")
+            else:
+                print(f"  │  ├─ [{i}/{total}] ⚠️  字幕なし: {video['title'][:50]}...")
+        submit_next()
+    
+    # 締め切りを過ぎた取得は待たない（実行中のyt-dlpは自身のタイムアウトで終わる）
+    pool.shutdown(wait=False, cancel_futures=True)
+    for i, video in futures.values():
+        print(f"  │  ├─ [{i}/{total}] ⏱️  締め切りで打ち切り: {video['title'][:50]}...")
+    
+    return [results[i] for i in sorted(results)], len(futures), from_store
+
+
+def collect_research(keyword, max_videos=3, transcript_workers=3, deadline=None, youtube_backend_name="auto",
+                     search_overfetch=2):
+    """
+    YouTube検索 + 字幕取得（ノウハウ抽出の前段。batch_runnerではキーワードごとに1回だけ実行）
+
+    Returns:
+        dict: {"keyword", "videos", "video_data_list", "timed_out", "from_store"}（JSON化できる）。失敗時はNone
+
+    字幕のない動画の分を見込んで max_videos × search_overfetch 件を検索する
+    """
+    # 検索・字幕取得のバックエンド（プロセス内で使い回す）
+    backend = youtube_backend.get_backend(youtube_backend_name)
+    if not backend:
+        print("  ⚠️  yt-dlpが見つかりません")
+        return None
+    print(f"  ├─ yt-dlp: {backend.name}")
+    
+    # YouTube動画を検索
+    print(f"  ├─ YouTube検索中: 「{keyword}」")
+    videos = search_youtube_videos(keyword, max_results=max_videos * max(1, search_overfetch), backend=backend)
+    
+    if not videos:
+        print("  ⚠️  動画が見つかりませんでした")
+        return None
+    
+    with_captions = sum(1 for video in videos if video.get('has_captions') is not False)
+    print(f"  │  └─ {len(videos)}件取得（日本語字幕あり: {with_captions}件）")
+    
+    # 字幕を取得（必要数そろったら終了）
+    print(f"  ├─ 字幕取得中（並列数: {transcript_workers}）...")
+    video_data_list, timed_out, from_store = fetch_transcripts(videos, backend, transcript_workers, deadline, max_videos)
+    
+    return {
+        "keyword": keyword,
+        "videos": videos,
+        "video_data_list": video_data_list,
+        "timed_out": timed_out,
+        "from_store": from_store,
+    }
 
-## よくある失敗パターン
 
-1. ...
-2. ...
+def research_file(research_dir, keyword, max_videos):
+    """共有リサーチの保存先（キーワード・動画数ごと）"""
+    digest = hashlib.sha256(json.dumps([keyword, max_videos], ensure_ascii=False).encode("utf-8")).hexdigest()
+    return Path(research_dir) / f"research_{digest[:16]}.json"
 
-## 重要な注意点
 
-- ...
+def save_research(research_dir, keyword, max_videos, research):
+    path = research_file(research_dir, keyword, max_videos)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(research, ensure_ascii=False), encoding="utf-8")
+    return path
 
-【抽出ルール】
-1. 発信者名や動画タイトルは一切記載しない
-2. ノウハウとテクニックのみを抽出
-3. 具体的で実践可能な内容に絞る
-4. 複数の動画で共通する内容を優先
-5. マトリクスは簡潔に（各セル100文字以内）
 
-それでは抽出を開始してください。
-"""
-    
+def load_research(research_dir, keyword, max_videos):
+    """共有リサーチを読み込む（なければNone）"""
+    path = research_file(research_dir, keyword, max_videos)
     try:
-        response = claude_client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=8000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        text = response.content[0].text
-        return text, response.usage.input_tokens, response.usage.output_tokens
-    
-    except Exception as e:
-        print(f"    ❌ エラー: {str(e)}")
-        return None, 0, 0
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
 
 
-def extract_knowhow_with_gemini(video_data_list, concept_content, gemini_client):
-    """Gemini APIでノウハウを抽出"""
+def build_knowhow_prompt(video_data_list, concept_content):
+    """ノウハウ抽出プロンプトを組み立てる（Claude/Gemini共通）"""
     # 動画情報をまとめる
     videos_summary = ""
     for i, video in enumerate(video_data_list, 1):
-        videos_summary += f"\n\n【動画{i}】\nタイトル: {video['title']}\n再生回数: {video['views']}\n\n字幕:\n{video['transcript'][:3000]}...\n"
+        videos_summary += f"\n\n【動画{i}】\nタイトル: {video['title']}\n再生回数: {video['views']}\n\n字幕:\n{video['transcript']}\n"
     
     prompt = f"""あなたはプロのコンテンツリサーチャーです。以下のYouTube動画の字幕から、実践的なノウハウとテクニックを抽出してください。
 
@@ -337,47 +246,110 @@ def extract_knowhow_with_gemini(video_data_list, concept_content, gemini_client)
 
 それでは抽出を開始してください。
 """
-    
-    try:
-        response = gemini_client.models.generate_content(
-            model="models/gemini-2.0-flash",
-            contents=prompt
-        )
-        text = response.text if hasattr(response, "text") else response.candidates[0].content.parts[0].text
-        return text, 0, 0  # Geminiのトークン情報は未集計
-    
-    except Exception as e:
-        print(f"    ❌ Geminiエラー: {str(e)}")
-        return None, 0, 0
-
-
-def run(project_dir, keyword="Threads 稼ぐ方法", max_videos=3, prefer_gemini=True):
-    """Phase 2実行"""
-    # APIキー読み込み
-    gemini_key = load_gemini_api_key() if prefer_gemini else None
-    claude_key = load_claude_api_key() if not prefer_gemini else None
-    
-    # Gemini優先、なければClaude
-    if prefer_gemini:
-        if gemini_key and GEMINI_AVAILABLE:
-            print("  ├─ Gemini APIキー読み込み中...")
-            print("  │  └─ Gemini APIキー: OK")
-            use_gemini = True
-        else:
-            print("  ├─ Gemini APIキーが見つかりません。Claudeを試します...")
-            claude_key = load_claude_api_key()
-            if not claude_key:
-                print("  ⚠️  Claude APIキーも見つかりません")
-                return None
-            print("  │  └─ Claude APIキー: OK")
-            use_gemini = False
-    else:
-        print("  ├─ Claude APIキー読み込み中...")
-        if not claude_key:
-            print("  ⚠️  Claude APIキーが見つかりません")
-            return None
-        print("  │  └─ Claude APIキー: OK")
-        use_gemini = False
+    return prompt
+
+
+def extract_knowhow(video_data_list, concept_content, chain):
+    """ノウハウを抽出（チェーンの順にフェイルオーバー）"""
+    prompt = build_knowhow_prompt(video_data_list, concept_content)
+    result = text_generation.generate(chain, prompt, max_tokens=8000, label="ノウハウ抽出")
+    usage = result["usage"]
+    return result["text"], usage["input_tokens"], usage["output_tokens"]
+
+
+# map-reduce抽出のチャンク要約に使う小さいモデル
+MAP_MODELS = {
+    "claude": "claude-3-5-haiku-20241022",
+    "gemini": "models/gemini-2.0-flash-lite",
+}
+
+
+def summarize_chunk(chunk, video_title, part, parts, chain):
+    """字幕の1チャンクを小さいモデルで要約（map）"""
+    prompt = f"""以下はYouTube動画の字幕の一部です（{part}/{parts}）。
+この部分で語られている実践的なノウハウ・手順・数値・注意点を、日本語の箇条書きで簡潔にまとめてください。
+発信者名や挨拶、雑談、宣伝は省いてください。ノウハウがなければ「なし」とだけ答えてください。
+
+【動画タイトル】
+{video_title}
+
+【字幕】
+{chunk}
+"""
+    result = text_generation.generate(chain, prompt, max_tokens=800, models=MAP_MODELS, limit_gemini=True,
+                                      label=f"チャンク要約 {part}/{parts}")
+    usage = result["usage"]
+    return result["text"], usage["input_tokens"], usage["output_tokens"]
+
+
+def map_transcripts(video_data_list, chain, chunk_tokens=3000, workers=4):
+    """
+    字幕全体をチャンクに分けて並列に要約し、動画ごとの要約を字幕の代わりに返す（map-reduceのmap）
+
+    Returns:
+        (video_data_list, input_tokens, output_tokens)
+    """
+    jobs = []
+    for vi, video in enumerate(video_data_list):
+        chunks = transcript_text.chunk(video['transcript'], chunk_tokens)
+        for ci, chunk in enumerate(chunks, 1):
+            jobs.append((vi, ci, len(chunks), chunk))
+    print(f"  ├─ チャンク要約中（{len(jobs)}チャンク / 並列数: {workers}）...")
+    
+    summaries = {}
+    input_tokens = 0
+    output_tokens = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            # copy_context: batch_runner --in-process のテーマ別ログ出力先をワーカースレッドにも引き継ぐ
+            pool.submit(contextvars.copy_context().run, summarize_chunk, chunk, video_data_list[vi]['title'],
+                        ci, parts, chain): (vi, ci)
+            for vi, ci, parts, chunk in jobs
+        }
+        for future in as_completed(futures):
+            text, in_tokens, out_tokens = future.result()
+            input_tokens += in_tokens
+            output_tokens += out_tokens
+            if text and text.strip() != "なし":
+                summaries[futures[future]] = text.strip()
+    
+    mapped = []
+    for vi, video in enumerate(video_data_list):
+        parts = [summaries[key] for key in sorted(summaries) if key[0] == vi]
+        # 要約がすべて失敗した動画は予算内に詰めた字幕で代用
+        mapped.append(dict(video, transcript="\n".join(parts) if parts else transcript_text.pack(video['transcript'], chunk_tokens)))
+    print(f"  │  └─ {len(summaries)}/{len(jobs)}チャンクを要約")
+    return mapped, input_tokens, output_tokens
+
+
+def run(project_dir, keyword="Threads 稼ぐ方法", max_videos=3, prefer_gemini=True,
+        transcript_workers=3, deadline_sec=None, youtube_backend_name="auto", research=None,
+        search_overfetch=2, transcript_token_budget=2000, knowhow_mode="single",
+        map_chunk_tokens=3000, map_workers=4):
+    """
+    Phase 2実行
+
+    Args:
+        search_overfetch: 字幕のない動画を見込んで max_videos の何倍を検索するか
+        transcript_token_budget: 正規化後の字幕を動画1本あたり何トークンまでプロンプトに入れるか
+        knowhow_mode: "single"（予算内に詰めた字幕を1回で抽出）/ "map_reduce"（字幕全体をチャンク要約してから抽出）
+        map_chunk_tokens: map_reduce のチャンクの大きさ（トークン）
+        map_workers: map_reduce でチャンクを同時に要約する数
+        research: collect_research の戻り値（batch_runnerの共有リサーチ）。あれば検索・字幕取得を省く
+        youtube_backend_name: "auto"（yt_dlpをimportできればライブラリ）/ "library" / "subprocess"
+        transcript_workers: 字幕を同時に取得する本数
+        deadline_sec: フェーズ開始から字幕取得を打ち切るまでの秒数（Noneなら全件待つ）
+    """
+    started = time.monotonic()
+    deadline = started + deadline_sec if deadline_sec else None
+    
+    # APIキーとSDKがそろっているプロバイダを優先順に並べる（Gemini優先、失敗時はClaude）
+    print("  ├─ APIキー読み込み中...")
+    chain = text_generation.provider_chain(prefer_gemini)
+    if not chain:
+        print("  ⚠️  Claude / Gemini のAPIキーが見つかりません")
+        return None
+    print(f"  │  └─ 使用するAPI: {text_generation.describe(chain)}")
     
     # コンセプトを読み込み
     print("  ├─ コンセプト読み込み中...")
@@ -391,75 +363,48 @@ def run(project_dir, keyword="Threads 稼ぐ方法", max_videos=3, prefer_gemini
     
     print("  │  └─ コンセプト: OK")
     
-    # YouTube動画を検索
-    print(f"  ├─ YouTube検索中: 「{keyword}」")
-    videos = search_youtube_videos(keyword, max_results=max_videos)
-    
-    if not videos:
-        print("  ⚠️  動画が見つかりませんでした")
-        return None
-    
-    print(f"  │  └─ {len(videos)}件取得")
-    
-    # yt-dlpのパスを探す
-    ytdlp_paths = [
-        "/Users/keigo/Library/Python/3.12/bin/yt-dlp",
-        "/usr/local/bin/yt-dlp",
-        "yt-dlp"
-    ]
-    
-    ytdlp_cmd = None
-    for path in ytdlp_paths:
-        try:
-            result_check = subprocess.run([path, "--version"], capture_output=True, timeout=5)
-            if result_check.returncode == 0:
-                ytdlp_cmd = path
-                break
-        except:
-            continue
-    
-    if not ytdlp_cmd:
-        print("  ⚠️  yt-dlpが見つかりません")
-        return None
-    
-    # 字幕を取得
-    print("  ├─ 字幕取得中...")
-    video_data_list = []
-    
-    for i, video in enumerate(videos, 1):
-        print(f"  │  ├─ [{i}/{len(videos)}] {video['title'][:50]}...")
-        
-        transcript = get_video_transcript(video['id'], ytdlp_cmd)
-        
-        if transcript:
-            video_data_list.append({
-                'title': video['title'],
-                'views': video['views'],
-                'transcript': transcript
-            })
-            print(f"  │  │  └─ ✅ 字幕取得完了 ({len(transcript)}文字)")
-        else:
-            print(f"  │  │  └─ ⚠️  字幕なし")
+    # 検索 + 字幕取得（batch_runnerの共有リサーチがあればそれを使う）
+    if research:
+        print(f"  ├─ 共有リサーチを使用: 「{research['keyword']}」({len(research['video_data_list'])}件の字幕)")
+    else:
+        research = collect_research(keyword, max_videos, transcript_workers, deadline, youtube_backend_name,
+                                    search_overfetch)
+        if not research:
+            return None
+    videos = research["videos"]
+    video_data_list = research["video_data_list"]
+    timed_out = research["timed_out"]
+    from_store = research["from_store"]
     
     if not video_data_list:
         print("  ⚠️  字幕を取得できた動画がありませんでした")
         return None
     
-    print(f"  │  └─ {len(video_data_list)}件の字幕を取得")
+    print(f"  │  └─ {len(video_data_list)}件の字幕を取得 ({time.monotonic() - started:.1f}秒)")
     
-    # ノウハウ抽出
-    if use_gemini:
-        print("  ├─ ノウハウ抽出中（Gemini API）...")
-        gemini_client = genai.Client(api_key=gemini_key, http_options={"api_version": "v1"})
-        knowhow_text, input_tokens, output_tokens = extract_knowhow_with_gemini(
-            video_data_list, concept_content, gemini_client
-        )
-    else:
-        print("  ├─ ノウハウ抽出中（Claude API）...")
-        claude_client = anthropic.Anthropic(api_key=claude_key)
-        knowhow_text, input_tokens, output_tokens = extract_knowhow_with_claude(
-            video_data_list, concept_content, claude_client
+    # 字幕を正規化（重複・フィラー除去）。map_reduce以外は動画ごとの予算に詰める
+    map_reduce = knowhow_mode == "map_reduce"
+    budget = None if map_reduce else transcript_token_budget
+    raw_chars = sum(len(video['transcript']) for video in video_data_list)
+    video_data_list = [
+        dict(video, transcript=transcript_text.prepare(video['transcript'], budget))
+        for video in video_data_list
+    ]
+    print(f"  ├─ 字幕を正規化: {raw_chars}文字 → {sum(len(video['transcript']) for video in video_data_list)}文字")
+    
+    map_input_tokens = 0
+    map_output_tokens = 0
+    if map_reduce:
+        video_data_list, map_input_tokens, map_output_tokens = map_transcripts(
+            video_data_list, chain, map_chunk_tokens, map_workers
         )
+        if text_generation.pending():
+            # batch_runner --batch-api のリクエスト収集中: 統合のプロンプトはチャンク要約の結果が入ってから作る
+            return None
+    
+    # ノウハウ抽出（map_reduceではチャンク要約を統合）
+    print(f"  ├─ ノウハウ抽出中（{text_generation.describe(chain)}）...")
+    knowhow_text, input_tokens, output_tokens = extract_knowhow(video_data_list, concept_content, chain)
     
     if not knowhow_text:
         print("  ⚠️  ノウハウ抽出失敗")
@@ -483,6 +428,11 @@ def run(project_dir, keyword="Threads 稼ぐ方法", max_videos=3, prefer_gemini
         "knowhow_file": str(knowhow_file),
         "videos_found": len(videos),
         "transcripts_retrieved": len(video_data_list),
+        "transcripts_timed_out": timed_out,
+        "transcripts_from_store": from_store,
         "input_tokens": input_tokens,
-        "output_tokens": output_tokens
+        "output_tokens": output_tokens,
+        # チャンク要約（MAP_MODELS）は単価が違うので別に集計
+        "map_input_tokens": map_input_tokens,
+        "map_output_tokens": map_output_tokens
     }
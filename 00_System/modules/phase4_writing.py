@@ -4,11 +4,16 @@ Phase 4: 執筆 & 画像生成
 テキスト執筆、画像生成、visual_map.md自動生成
 """
 
-from pathlib import Path
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import base64
+import contextvars
 import os
-import anthropic
-from google import genai
+import re
+import random
+import time
+
+from . import clients, credentials, knowhow_index, llm_cache, rate_limiter, text_generation
+from .text_generation import USAGE_KEYS, empty_usage
 
 
 def parse_structure_plan(structure_file):
@@ -186,114 +191,120 @@ def generate_visual_map(sections, output_file):
     return output_file
 
 
-def load_api_keys():
-    """APIキーを環境変数または.envファイルから読み込む"""
-    # Claude API Key
-    claude_key = os.environ.get('ANTHROPIC_API_KEY')
-    if not claude_key:
-        env_paths = [
-            Path("/Users/keigo/001_cursor/.env"),
-            Path("/Users/keigo/001_cursor/文字起こしブースター/mioji_share_v2/.env"),
-        ]
-        for env_path in env_paths:
-            if env_path.exists():
-                try:
-                    with open(env_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            line = line.strip()
-                            if line and not line.startswith("#") and "=" in line:
-                                key, value = line.split("=", 1)
-                                key = key.strip()
-                                value = value.strip().strip('"').strip("'")
-                                if key == "ANTHROPIC_API_KEY":
-                                    claude_key = value.strip()
-                                    break
-                except Exception:
-                    continue
-            if claude_key:
-                break
-    
-    # Gemini API Key
-    gemini_key = os.environ.get('GEMINI_API_KEY') or os.environ.get('GOOGLE_API_KEY')
-    if not gemini_key:
-        for env_path in env_paths:
-            if env_path.exists():
-                try:
-                    with open(env_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            line = line.strip()
-                            if line and not line.startswith("#") and "=" in line:
-                                key, value = line.split("=", 1)
-                                key = key.strip()
-                                value = value.strip().strip('"').strip("'")
-                                if key in ["GEMINI_API_KEY", "GOOGLE_API_KEY"]:
-                                    gemini_key = value.strip()
-                                    break
-                except Exception:
-                    continue
-            if gemini_key:
-                break
-    
-    return claude_key, gemini_key
-
-
-def generate_text_with_claude(section_name, section_info, knowhow_content, concept_content, claude_client):
-    """Claude APIでテキストを生成"""
-    # プロンプト構築
-    prompt = f"""あなたはプロのコンテンツライターです。以下の情報をもとに、Brain/Tips向けの記事の一部を執筆してください。
+def draft_filename(index, section_name):
+    """03_Content_Draft のファイル名（構成順の番号 + セクション名）"""
+    return f"{index:02d}_{section_name.replace(' ', '_').replace('：', '_').replace(':', '_')[:30]}.md"
 
-【セクション名】
-{section_name}
 
-【目的】
-{section_info.get('purpose', '情報提供')}
+def planned_outputs(project_dir, enable_text_generation=True, enable_image_generation=True):
+    """
+    structure_plan.md から決まるPhase 4の出力ファイル（run_text_pipeline / run_image_pipeline と同じ名前）
+
+    生成に失敗したファイルも含むので、チェックポイントはこれが欠けていればPhase 4を再実行する
+    """
+    sections = parse_structure_plan(project_dir / "02_Planning" / "structure_plan.md")
+    files = []
+    if enable_text_generation:
+        files += [project_dir / "03_Content_Draft" / draft_filename(i, name) for i, name in enumerate(sections, 1)]
+    if enable_image_generation:
+        files += [
+            image_output_file(project_dir / "04_Images", img_info["file"])
+            for data in sections.values() for img_info in data["images"]
+        ]
+    return files
+
+
+class DraftStream:
+    """
+    ストリーミング中の本文を `NN_xxx.md.part` に追記し、完了したら `NN_xxx.md` に置き換える
+    （Phase 5は *.md だけを取り込み、.part が残っている間は記事を組み立てない）
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.part_file = output_file.with_name(output_file.name + ".part")
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.finished_at = None
+        self.output_tokens = 0
+        self._file = None
+
+    def begin(self):
+        """リクエスト送信時刻（レート制限の待ち時間を初回トークンまでの秒数に含めない）"""
+        self.started = time.monotonic()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if self._file is None:
+            self.first_token_at = time.monotonic()
+            self.part_file.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.part_file, "w", encoding="utf-8")
+        self._file.write(chunk)
+        self._file.flush()
+
+    def commit(self, output_tokens):
+        """完成したファイルに置き換える"""
+        self.finished_at = time.monotonic()
+        self.output_tokens = output_tokens
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.replace(self.part_file, self.output_file)
+
+    def discard(self):
+        """失敗時に書きかけを消す（リトライは新しい .part から書き直す）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.part_file.unlink(missing_ok=True)
+        self.first_token_at = None
+
+    def metrics(self):
+        """最初のトークンまでの秒数とトークン/秒"""
+        if self.first_token_at is None or self.finished_at is None:
+            return {"ttft": None, "tokens_per_sec": None}
+        generating = max(self.finished_at - self.first_token_at, 1e-6)
+        return {
+            "ttft": round(self.first_token_at - self.started, 2),
+            "tokens_per_sec": round(self.output_tokens / generating, 1),
+        }
 
-【文字数】
-{section_info.get('chars', '800-1000')}文字
 
-【参考ノウハウ】
+def build_section_context(knowhow_content, concept_content):
+    """
+    全セクション共通のシステムプロンプト（ノウハウ・コンセプト・共通ルール）
+
+    セクションをまたいで一字一句同じになるよう、セクション固有の情報は含めない
+    （Claudeではプロンプトキャッシュで2セクション目以降は読み出しだけになる。Geminiではsystem_instruction）
+    knowhow_content がNoneのとき（セクションごとにノウハウを検索する場合）はコンセプトとルールだけ
+    """
+    knowhow_block = f"""【参考ノウハウ】
 {knowhow_content}
 
-【コンセプト】
+""" if knowhow_content is not None else ""
+    return f"""あなたはプロのコンテンツライターです。以下の情報をもとに、Brain/Tips向けの記事を1セクションずつ執筆します。
+
+{knowhow_block}【コンセプト】
 {concept_content}
 
 【執筆ルール】
-1. **必ず最初の見出しには、指定されたセクション名「{section_name}」をそのまま使用してください**
-2. 見出しは ## {section_name} という形式で開始してください
-3. セクション名は一字一句変更せず、完全に同じものを使用してください
-4. 読者に寄り添う、わかりやすい文章で書く
-5. 具体例を交えて説明する
-6. 実践的な内容を重視する
-7. サブ見出しは ### を使う
-8. リストや箇条書きを適宜使用する
-9. 発信者名や他のクリエイター名は一切記載しない
-
-【重要】
-記事の最初の見出しは必ず「## {section_name}」で始めてください。セクション名を変更したり、言い換えたりしないでください。
-
-それでは執筆を開始してください。
+1. 読者に寄り添う、わかりやすい文章で書く
+2. 具体例を交えて説明する
+3. 実践的な内容を重視する
+4. サブ見出しは ### を使う
+5. リストや箇条書きを適宜使用する
+6. 発信者名や他のクリエイター名は一切記載しない
 """
-    
-    try:
-        response = claude_client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        text = response.content[0].text
-        return text, response.usage.input_tokens, response.usage.output_tokens
-    
-    except Exception as e:
-        print(f"    ❌ エラー: {str(e)}")
-        return None, 0, 0
 
 
-def generate_text_with_gemini(section_name, section_info, knowhow_content, concept_content, gemini_client):
-    """Gemini APIでテキストを生成（Claude代替）"""
-    prompt = f"""あなたはプロのコンテンツライターです。以下の情報をもとに、Brain/Tips向けの記事の一部を執筆してください。
+def build_section_prompt(section_name, section_info, section_knowhow=None):
+    """セクションごとに変わる部分（ユーザーメッセージ）"""
+    knowhow_block = f"""【参考ノウハウ（このセクションに関連する部分）】
+{section_knowhow}
+
+""" if section_knowhow is not None else ""
+    return f"""以下のセクションを執筆してください。
 
 【セクション名】
 {section_name}
@@ -304,37 +315,91 @@ def generate_text_with_gemini(section_name, section_info, knowhow_content, conce
 【文字数】
 {section_info.get('chars', '800-1000')}文字
 
-【参考ノウハウ】
-{knowhow_content}
+{knowhow_block}【重要】
+1. **必ず最初の見出しには、指定されたセクション名「{section_name}」をそのまま使用してください**
+2. 見出しは ## {section_name} という形式で開始してください
+3. セクション名は一字一句変更せず、完全に同じものを使用してください
 
-【コンセプト】
-{concept_content}
+それでは執筆を開始してください。
+"""
 
-【執筆ルール】
-1. 最初の見出しは必ず「## {section_name}」で始める（名称は一字一句変更しない）
-2. 読者に寄り添う、わかりやすい文章で書く
-3. 具体例を交えて説明する
-4. 実践的な内容を重視する
-5. サブ見出しは ### を使う
-6. リストや箇条書きを適宜使用する
-7. 発信者名や他のクリエイター名は一切記載しない
 
-それでは執筆を開始してください。"""
+def generate_text(section_name, section_info, knowhow_content, concept_content, chain,
+                  section_knowhow=None, stream=None):
+    """
+    1セクションのテキストを生成（チェーンの順にフェイルオーバー）
 
-    try:
-        response = gemini_client.models.generate_content(
-            model="models/gemini-2.0-flash",
-            contents=prompt
+    Args:
+        section_knowhow: セクションに関連するノウハウだけを渡す場合（knowhow_contentの代わりにユーザーメッセージへ入れる）
+        stream: DraftStream（あれば受け取りながらファイルに書く）
+
+    Returns:
+        (text, usage)
+    """
+    # 共通部分はsystemにまとめてキャッシュ対象にし、セクション固有の部分だけをユーザーメッセージで送る
+    if section_knowhow is not None:
+        context = build_section_context(None, concept_content)
+    else:
+        context = build_section_context(knowhow_content, concept_content)
+    prompt = build_section_prompt(section_name, section_info, section_knowhow)
+    
+    result = text_generation.generate(chain, prompt, system=context, max_tokens=4000, stream=stream, label=section_name)
+    return result["text"], result["usage"]
+
+
+def generate_section_text(index, section_name, section_data, knowhow_content, concept_content,
+                          chain, max_retries=2, knowhow_retriever=None, stream_file=None):
+    """
+    1セクション分のテキストを生成（チェーン全体が失敗したらこのセクションだけリトライ）
+
+    Args:
+        knowhow_retriever: knowhow_index.KnowhowIndex（あればセクション名・目的で関連ノウハウだけを検索して使う）
+        stream_file: ストリーミング時の出力先（届いた分から .part に書き、完了したらこの名前にする）
+    """
+    section_info = {
+        "purpose": section_data.get("purpose", "情報提供"),
+        "chars": section_data.get("chars", "800-1000")
+    }
+    section_knowhow = (
+        knowhow_retriever.select(f"{section_name} {section_info['purpose']}") if knowhow_retriever else None
+    )
+    
+    started = time.monotonic()
+    text, usage = None, empty_usage()
+    stream = None
+    attempt = 0
+    for attempt in range(1, max_retries + 2):
+        stream = DraftStream(stream_file) if stream_file else None
+        text, usage = generate_text(
+            section_name, section_info, knowhow_content, concept_content, chain,
+            section_knowhow=section_knowhow, stream=stream
         )
-        text = response.text if hasattr(response, "text") else None
-        return text, 0, 0  # Geminiのトークン情報は未集計
-    except Exception as e:
-        print(f"    ❌ Geminiエラー: {str(e)}")
-        return None, 0, 0
+        if text or text_generation.pending():
+            break
+        if attempt <= max_retries:
+            print(f"    🔁 リトライ {attempt}/{max_retries}: {section_name}")
+            time.sleep(2 ** attempt)
+    
+    return {
+        "index": index,
+        "section": section_name,
+        "text": text,
+        "usage": usage,
+        "seconds": time.monotonic() - started,
+        # キャッシュヒット時はストリーミングせずに返るので、ファイルは呼び出し側で書く
+        "streamed": bool(stream and stream.finished_at),
+        **(stream.metrics() if stream else {"ttft": None, "tokens_per_sec": None}),
+        "attempts": attempt
+    }
+
 
+def generate_image_with_gemini(image_filename, section_name, gemini_client, max_retries=4, cache_context=""):
+    """
+    Gemini APIで画像を生成（429/503はバックオフして再試行）
 
-def generate_image_with_gemini(image_filename, section_name, gemini_client):
-    """Gemini APIで画像を生成"""
+    プロンプトはファイル名とセクション名だけで決まり、別テーマでも同じになるため、
+    キャッシュのキーには cache_context（記事のコンセプト）も含める。cache_context がなければキャッシュしない
+    """
     print(f"        🔍 generate_image_with_gemini: {image_filename}")
     
     # 画像タイプを判定
@@ -371,39 +436,261 @@ Style:
 IMPORTANT: Output in 16:9 landscape format, 1376x768 pixels.
 """
     
+    model = "gemini-3-pro-image-preview"
+    cache_params = {"context": cache_context}
+    cached = llm_cache.get("gemini", model, prompt, cache_params) if cache_context else None
+    if cached:
+        print(f"        ♻️  キャッシュ使用: {image_filename}")
+        return base64.b64decode(cached["image_b64"])
+    
+    for attempt in range(max_retries + 1):
+        try:
+            rate_limiter.acquire("gemini_image")
+            print(f"        📡 API呼び出し: model={model}")
+            response = gemini_client.models.generate_content(
+                model=model,
+                contents=prompt
+            )
+            print(f"        ✅ API呼び出し成功")
+            
+            # 画像データを取得
+            if hasattr(response, 'candidates') and response.candidates:
+                for candidate in response.candidates:
+                    if hasattr(candidate, 'content') and candidate.content:
+                        if hasattr(candidate.content, 'parts') and candidate.content.parts:
+                            for part in candidate.content.parts:
+                                if hasattr(part, 'inline_data') and part.inline_data:
+                                    image_data = part.inline_data.data
+                                    print(f"        ✅ 画像データ取得: {len(image_data)} bytes")
+                                    if cache_context:
+                                        llm_cache.put("gemini", model, prompt, {"image_b64": base64.b64encode(image_data).decode("ascii")},
+                                                      cache_params)
+                                    return image_data
+            
+            print(f"        ⚠️  画像データが見つかりませんでした")
+            return None
+        
+        except Exception as e:
+            # 429 / 503 は指数バックオフで再試行
+            if is_retryable_error(e) and attempt < max_retries:
+                wait = min(60, 2 ** (attempt + 2)) + random.uniform(0, 1)
+                print(f"        ⏳ {image_filename}: 混雑中のため{wait:.0f}秒後に再試行 ({attempt + 1}/{max_retries})")
+                time.sleep(wait)
+                continue
+            print(f"        ❌ API エラー: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    return None
+
+
+def is_retryable_error(error):
+    """レート制限・一時的な過負荷（429/503）かどうか"""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 503):
+        return True
+    message = str(error)
+    return any(marker in message for marker in ("429", "503", "RESOURCE_EXHAUSTED", "UNAVAILABLE"))
+
+
+def image_output_file(images_dir, filename):
+    """画像ファイル名からカテゴリ別の保存先を決定"""
+    if "ill_" in filename:
+        category = "illustrations"
+    elif "banner_" in filename:
+        category = "banners"
+    elif "text_banner_" in filename:
+        category = "text_banners"
+    elif "bonus_" in filename:
+        category = "bonus_thumbnails"
+    else:
+        category = "illustrations"
+    return images_dir / category / filename
+
+
+def generate_and_save_image(filename, section_name, output_file, gemini_client, max_retries=4, cache_context=""):
+    """画像を1枚生成し、完成次第すぐに保存"""
+    started = time.monotonic()
     try:
-        print(f"        📡 API呼び出し: model=gemini-3-pro-image-preview")
-        response = gemini_client.models.generate_content(
-            model="gemini-3-pro-image-preview",
-            contents=prompt
-        )
-        print(f"        ✅ API呼び出し成功")
+        image_data = generate_image_with_gemini(filename, section_name, gemini_client, max_retries=max_retries,
+                                                cache_context=cache_context)
+    except Exception as e:
+        print(f"  │  │  │  └─ ❌ 例外発生: {str(e)}")
+        image_data = None
+    
+    if image_data:
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        output_file.write_bytes(image_data)
+    
+    return {
+        "file": filename,
+        "section": section_name,
+        "bytes": len(image_data) if image_data else 0,
+        "seconds": time.monotonic() - started
+    }
+
+
+def run_text_pipeline(sections, draft_dir, knowhow_content, concept_content, chain,
+                      text_concurrency=4, text_max_retries=2, knowhow_top_k=0, knowhow_token_budget=1500,
+                      stream_text=False, on_section_done=None):
+    """
+    セクション本文を並列生成して 03_Content_Draft に保存
+
+    1番手がClaudeなら1セクション目を先に単独で生成してプロンプトキャッシュを書き込み、
+    残りのセクションはキャッシュを読む状態で並列に送る
+    knowhow_top_k > 0 なら、ノウハウ全文ではなくセクションごとに関連するチャンクだけを入れる
+    stream_text なら届いた分から `.md.part` に書き、セクションが完成した時点で `.md` にする
+    on_section_done(index, path) はセクションの `.md` ができるたびに呼ぶ（Phase 5の本文取り込み）
+    """
+    usage_total = empty_usage()
+    text_files_created = 0
+    section_latencies = []
+    started = time.monotonic()
+    
+    print(f"  ├─ テキスト生成中（{text_generation.describe(chain)}）...")
+    draft_dir.mkdir(parents=True, exist_ok=True)
+    
+    knowhow_retriever = None
+    if knowhow_top_k > 0:
+        knowhow_retriever = knowhow_index.KnowhowIndex(knowhow_content, top_k=knowhow_top_k, token_budget=knowhow_token_budget)
+        print(f"  │  ├─ ノウハウ検索: {len(knowhow_retriever.chunks)}チャンクから上位{knowhow_top_k}件（{knowhow_token_budget}トークン以内）")
+    
+    # セクションごとのリクエストを並列送信（ファイル番号は構成順で固定）
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, text_concurrency)) as pool:
+        items = list(enumerate(sections.items(), 1))
+        # 同時に送るとどのリクエストもキャッシュを書き込む側になるため、Claudeは1件目で温めてから並列にする
+        warmup = None
+        if items and chain[0].name == "claude":
+            i, (section_name, section_data) = items.pop(0)
+            warmup = pool.submit(
+                contextvars.copy_context().run, generate_section_text, i, section_name, section_data,
+                knowhow_content, concept_content, chain, text_max_retries, knowhow_retriever,
+                draft_dir / draft_filename(i, section_name) if stream_text else None
+            )
+            wait([warmup])
+            futures.append(warmup)
         
-        # 画像データを取得
-        if hasattr(response, 'candidates') and response.candidates:
-            for candidate in response.candidates:
-                if hasattr(candidate, 'content') and candidate.content:
-                    if hasattr(candidate.content, 'parts') and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'inline_data') and part.inline_data:
-                                image_data = part.inline_data.data
-                                print(f"        ✅ 画像データ取得: {len(image_data)} bytes")
-                                return image_data
+        for i, (section_name, section_data) in items:
+            futures.append(pool.submit(
+                contextvars.copy_context().run, generate_section_text, i, section_name, section_data,
+                knowhow_content, concept_content, chain, text_max_retries, knowhow_retriever,
+                draft_dir / draft_filename(i, section_name) if stream_text else None
+            ))
         
-        print(f"        ⚠️  画像データが見つかりませんでした")
-        return None
+        for future in as_completed(futures):
+            result = future.result()
+            i = result["index"]
+            section_name = result["section"]
+            text = result["text"]
+            section_latencies.append({
+                "index": i,
+                "section": section_name,
+                "seconds": round(result["seconds"], 2),
+                "attempts": result["attempts"],
+                "ttft": result["ttft"],
+                "tokens_per_sec": result["tokens_per_sec"],
+                "success": bool(text)
+            })
+            streaming_info = f", 初回トークン{result['ttft']:.1f}秒, {result['tokens_per_sec']:.0f}トークン/秒" if result["ttft"] is not None else ""
+            print(f"  │  ├─ [{i}/{len(sections)}] {section_name} ({result['seconds']:.1f}秒, 試行{result['attempts']}回{streaming_info})")
+            
+            if text:
+                filename = draft_filename(i, section_name)
+                if not result["streamed"]:
+                    (draft_dir / filename).write_text(text, encoding="utf-8")
+                
+                if on_section_done:
+                    on_section_done(i, draft_dir / filename)
+                
+                for key in USAGE_KEYS:
+                    usage_total[key] += result["usage"][key]
+                text_files_created += 1
+                print(f"  │  │  └─ ✅ {filename} ({len(text)}文字)")
+            else:
+                print(f"  │  │  └─ ⚠️  生成失敗")
     
-    except Exception as e:
-        print(f"        ❌ API エラー: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
+    section_latencies.sort(key=lambda x: x["index"])
+    print(f"  │  └─ {text_files_created}ファイル生成完了")
+    if any(provider.name == "claude" for provider in chain):
+        print(f"  │     プロンプトキャッシュ: 書き込み {usage_total['cache_creation_input_tokens']:,} / 読み出し {usage_total['cache_read_input_tokens']:,} トークン")
+    
+    return {
+        "text_files": text_files_created,
+        "total_input_tokens": usage_total["input_tokens"],
+        "total_output_tokens": usage_total["output_tokens"],
+        "cache_creation_input_tokens": usage_total["cache_creation_input_tokens"],
+        "cache_read_input_tokens": usage_total["cache_read_input_tokens"],
+        "section_latencies": section_latencies,
+        "seconds": round(time.monotonic() - started, 2)
+    }
 
 
-def run(project_dir, enable_text_generation=True, enable_image_generation=True, prefer_gemini_for_text=False):
-    """Phase 4実行"""
+def run_image_pipeline(sections, images_dir, gemini_client, image_concurrency=3, image_max_retries=4, cache_context=""):
+    """未生成の画像を並列生成して 04_Images に保存（cache_context は画像キャッシュのキーに含める記事のコンセプト）"""
+    images_created = 0
+    started = time.monotonic()
+    
+    print("  ├─ 画像生成中（Gemini API）...")
+    
+    # 画像リストを確認
+    total_images = sum(len(data["images"]) for data in sections.values())
+    print(f"  │  └─ 生成予定画像数: {total_images}枚")
+    
+    # 既存画像はスキップし、未生成分だけを並列で取得（再開時も不足分のみ）
+    jobs = []
+    planned = set()
+    for section_name, section_data in sections.items():
+        for img_info in section_data["images"]:
+            filename = img_info['file']
+            output_file = image_output_file(images_dir, filename)
+            if output_file in planned:
+                continue
+            planned.add(output_file)
+            if output_file.exists():
+                print(f"  │  ├─ ⏭️  {filename} (既存)")
+                continue
+            jobs.append((filename, section_name, output_file))
+    
+    print(f"  │  ├─ 未生成: {len(jobs)}枚（同時{image_concurrency}枚まで）")
+    
+    with ThreadPoolExecutor(max_workers=max(1, image_concurrency)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, generate_and_save_image, filename, section_name, output_file, gemini_client,
+                        image_max_retries, cache_context)
+            for filename, section_name, output_file in jobs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result["bytes"]:
+                images_created += 1
+                print(f"  │  │  └─ ✅ {result['file']} 保存完了 ({result['seconds']:.1f}秒)")
+            else:
+                print(f"  │  │  └─ ⚠️  {result['file']} 生成失敗")
+    
+    print(f"  │  └─ {images_created}枚生成完了")
+    
+    return {
+        "images_created": images_created,
+        "seconds": round(time.monotonic() - started, 2)
+    }
+
+
+def run(project_dir, enable_text_generation=True, enable_image_generation=True, prefer_gemini_for_text=False,
+        text_concurrency=4, text_max_retries=2, image_concurrency=3, image_max_retries=4,
+        knowhow_top_k=0, knowhow_token_budget=1500, stream_text=False, on_section_done=None):
+    """
+    Phase 4実行
+
+    Args:
+        knowhow_top_k: セクションごとに関連ノウハウを何チャンク入れるか（0ならノウハウ全文）
+        knowhow_token_budget: セクションごとのノウハウのトークン上限
+        stream_text: 本文をストリーミングで受け取り、届いた分からファイルに書く
+        on_section_done: セクションの本文ファイルが完成するたびに (番号, パス) で呼ぶ関数
+    """
     print("  ├─ APIキー読み込み中...")
-    claude_key, gemini_key = load_api_keys()
+    claude_key, gemini_key = credentials.get_claude_api_key(), credentials.get_gemini_api_key()
     
     if not claude_key:
         print("  ⚠️  Claude APIキーが見つかりません")
@@ -416,21 +703,17 @@ def run(project_dir, enable_text_generation=True, enable_image_generation=True,
     else:
         print("  │  └─ Gemini APIキー: OK")
     
-    # Claude/Geminiクライアント初期化
-    claude_client = anthropic.Anthropic(api_key=claude_key) if claude_key else None
-    gemini_client = genai.Client(api_key=gemini_key, http_options={"api_version": "v1"}) if gemini_key else None
-
-    # テキスト生成クライアントの決定
-    use_gemini_for_text = prefer_gemini_for_text or (not claude_client and gemini_client)
-    text_client_name = "Gemini" if use_gemini_for_text else "Claude"
+    # テキスト生成はキーのあるプロバイダを優先順に並べてフェイルオーバー（画像はGeminiのみ）
+    chain = []
     if enable_text_generation:
-        if use_gemini_for_text and not gemini_client:
-            print("  ⚠️  Geminiクライアント未初期化のためテキスト生成をスキップ")
-            enable_text_generation = False
-        elif (not use_gemini_for_text) and (not claude_client):
-            print("  ⚠️  Claudeクライアント未初期化のためテキスト生成をスキップ")
+        chain = text_generation.provider_chain(prefer_gemini_for_text)
+        if not chain:
+            print("  ⚠️  使えるテキスト生成APIがないためテキスト生成をスキップ")
             enable_text_generation = False
     
+    # 画像生成クライアントを初期化（プロセス内で共有）
+    gemini_client = clients.get_gemini_client(gemini_key) if enable_image_generation else None
+    
     print("  ├─ structure_plan.md 読み込み中...")
     structure_file = project_dir / "02_Planning" / "structure_plan.md"
     
@@ -449,50 +732,7 @@ def run(project_dir, enable_text_generation=True, enable_image_generation=True,
     knowhow_content = knowhow_file.read_text(encoding="utf-8") if knowhow_file.exists() else ""
     concept_content = concept_file.read_text(encoding="utf-8") if concept_file.exists() else ""
     
-    # テキスト生成
-    total_input_tokens = 0
-    total_output_tokens = 0
-    text_files_created = 0
-    
-    if enable_text_generation:
-        print(f"  ├─ テキスト生成中（{text_client_name} API）...")
-        draft_dir = project_dir / "03_Content_Draft"
-        draft_dir.mkdir(parents=True, exist_ok=True)
-        
-        for i, (section_name, section_data) in enumerate(sections.items(), 1):
-            print(f"  │  ├─ [{i}/{len(sections)}] {section_name}")
-            
-            # セクション情報を取得
-            section_info = {
-                "purpose": section_data.get("purpose", "情報提供"),
-                "chars": section_data.get("chars", "800-1000")
-            }
-            
-            if use_gemini_for_text:
-                text, input_tokens, output_tokens = generate_text_with_gemini(
-                    section_name, section_info, knowhow_content, concept_content, gemini_client
-                )
-            else:
-            text, input_tokens, output_tokens = generate_text_with_claude(
-                section_name, section_info, knowhow_content, concept_content, claude_client
-            )
-            
-            if text:
-                # ファイル名を生成
-                filename = f"{i:02d}_{section_name.replace(' ', '_').replace('：', '_').replace(':', '_')[:30]}.md"
-                output_file = draft_dir / filename
-                output_file.write_text(text, encoding="utf-8")
-                
-                total_input_tokens += input_tokens
-                total_output_tokens += output_tokens
-                text_files_created += 1
-                print(f"  │  │  └─ ✅ {filename} ({len(text)}文字)")
-            else:
-                print(f"  │  │  └─ ⚠️  生成失敗")
-        
-        print(f"  │  └─ {text_files_created}ファイル生成完了")
-    
-    # visual_map.md を自動生成
+    # visual_map.md を自動生成（構成プランだけで決まるので先に作る）
     print("  ├─ visual_map.md 自動生成中...")
     visual_map_file = project_dir / "02_Planning" / "visual_map.md"
     # sectionsから画像情報のみを抽出
@@ -505,78 +745,52 @@ def run(project_dir, enable_text_generation=True, enable_image_generation=True,
     generate_visual_map(sections_for_visual_map, visual_map_file)
     print(f"  │  └─ {visual_map_file.name} 保存完了")
     
-    # 画像生成
-    images_created = 0
-    
     print(f"\n  🔍 DEBUG: enable_image_generation={enable_image_generation}")
     print(f"  🔍 DEBUG: gemini_client={gemini_client is not None}")
     print(f"  🔍 DEBUG: sections count={len(sections)}")
     
-    if enable_image_generation and gemini_client:
-        print("  ├─ 画像生成中（Gemini API）...")
-        images_dir = project_dir / "04_Images"
+    # テキストと画像は互いに依存しないので同時に走らせ、最後に合流する
+    # （copy_context: batch_runner --in-process のテーマ別ログ出力先をワーカースレッドにも引き継ぐ）
+    text_result = {"text_files": 0, "total_input_tokens": 0, "total_output_tokens": 0,
+                   "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "section_latencies": [], "seconds": 0}
+    image_result = {"images_created": 0, "seconds": 0}
+    started = time.monotonic()
+    
+    with ThreadPoolExecutor(max_workers=2) as stage_pool:
+        text_future = None
+        image_future = None
         
-        # 画像リストを確認
-        total_images = sum(len(data["images"]) for data in sections.values())
-        print(f"  │  └─ 生成予定画像数: {total_images}枚")
+        if enable_text_generation:
+            text_future = stage_pool.submit(
+                contextvars.copy_context().run, run_text_pipeline, sections, project_dir / "03_Content_Draft",
+                knowhow_content, concept_content, chain, text_concurrency, text_max_retries,
+                knowhow_top_k, knowhow_token_budget, stream_text, on_section_done
+            )
         
-        for section_name, section_data in sections.items():
-            images = section_data["images"]
-            if not images:
-                continue
-            print(f"  │  ├─ セクション「{section_name}」: {len(images)}枚")
-            
-            for img_info in images:
-                filename = img_info['file']
-                print(f"  │  │  ├─ 処理中: {filename}")
-                
-                # 画像カテゴリを判定
-                if "ill_" in filename:
-                    category = "illustrations"
-                elif "banner_" in filename:
-                    category = "banners"
-                elif "text_banner_" in filename:
-                    category = "text_banners"
-                elif "bonus_" in filename:
-                    category = "bonus_thumbnails"
-                else:
-                    category = "illustrations"
-                
-                output_dir = images_dir / category
-                output_dir.mkdir(parents=True, exist_ok=True)
-                output_file = output_dir / filename
-                
-                # 既に存在する場合はスキップ
-                if output_file.exists():
-                    print(f"  │  ├─ ⏭️  {filename} (既存)")
-                    continue
-                
-                print(f"  │  │  ├─ 🎨 生成開始: {filename}")
-                
-                try:
-                    image_data = generate_image_with_gemini(filename, section_name, gemini_client)
-                    print(f"  │  │  │  └─ 生成結果: {len(image_data) if image_data else 0} bytes")
-                except Exception as e:
-                    print(f"  │  │  │  └─ ❌ 例外発生: {str(e)}")
-                    image_data = None
-                
-                if image_data:
-                    output_file.write_bytes(image_data)
-                    images_created += 1
-                    print(f"  │  │  └─ ✅ 保存完了")
-                else:
-                    print(f"  │  │  └─ ⚠️  生成失敗")
+        if enable_image_generation and gemini_client:
+            image_future = stage_pool.submit(
+                contextvars.copy_context().run, run_image_pipeline, sections, project_dir / "04_Images",
+                gemini_client, image_concurrency, image_max_retries, concept_content
+            )
         
-        print(f"  │  └─ {images_created}枚生成完了")
+        if text_future:
+            text_result = text_future.result()
+        if image_future:
+            image_result = image_future.result()
     
+    print(f"  │  └─ テキスト {text_result['seconds']}秒 / 画像 {image_result['seconds']}秒 → 合計 {time.monotonic() - started:.1f}秒")
     print("  └─ Phase 4完了")
     
     return {
         "visual_map_file": str(visual_map_file),
         "sections": len(sections),
-        "text_files": text_files_created,
-        "images_created": images_created,
-        "total_input_tokens": total_input_tokens,
-        "total_output_tokens": total_output_tokens
+        "text_files": text_result["text_files"],
+        "images_created": image_result["images_created"],
+        "total_input_tokens": text_result["total_input_tokens"],
+        "total_output_tokens": text_result["total_output_tokens"],
+        "cache_creation_input_tokens": text_result["cache_creation_input_tokens"],
+        "cache_read_input_tokens": text_result["cache_read_input_tokens"],
+        "section_latencies": text_result["section_latencies"],
+        "text_seconds": text_result["seconds"],
+        "image_seconds": image_result["seconds"]
     }
-
@@ -8,6 +8,7 @@ from pathlib import Path
 import zipfile
 import json
 import re
+import threading
 from datetime import datetime
 
 
@@ -36,40 +37,86 @@ def collect_images(images_dir):
     return images, all_images
 
 
-def integrate_texts(text_files):
-    """テキストファイルを統合"""
-    combined = []
-    
-    for i, text_file in enumerate(text_files):
-        content = text_file.read_text(encoding="utf-8")
-        
-        # ファイル名からセクション名を推測
-        filename = text_file.stem
-        if "Free_Part" in filename:
-            section_title = "📖 無料パート"
-        elif "Paid_Part" in filename:
-            if "Intro" in filename or "Step1" in filename:
-                section_title = "💎 有料パート - イントロダクション & STEP 1"
-            elif "Step2" in filename:
-                section_title = "💎 有料パート - STEP 2"
-            elif "Step3" in filename:
-                section_title = "💎 有料パート - STEP 3"
-            elif "Step4" in filename:
-                section_title = "💎 有料パート - STEP 4"
-            elif "Step5" in filename:
-                section_title = "💎 有料パート - STEP 5"
-            elif "Conclusion" in filename:
-                section_title = "💎 有料パート - 結論"
-            else:
-                section_title = "💎 有料パート"
+def integrate_texts(text_files, contents=None):
+    """テキストファイルを統合（contents: 読み込み済みの本文 {ファイル: 本文}）"""
+    contents = contents or {}
+    return "".join(
+        section_block(i, text_file, contents[text_file] if text_file in contents else text_file.read_text(encoding="utf-8"))
+        for i, text_file in enumerate(text_files)
+    )
+
+
+def section_block(i, text_file, content):
+    """1セクション分の区切り見出し + 本文（i は記事内の順番、0始まり）"""
+    # ファイル名からセクション名を推測
+    filename = text_file.stem
+    if "Free_Part" in filename:
+        section_title = "📖 無料パート"
+    elif "Paid_Part" in filename:
+        if "Intro" in filename or "Step1" in filename:
+            section_title = "💎 有料パート - イントロダクション & STEP 1"
+        elif "Step2" in filename:
+            section_title = "💎 有料パート - STEP 2"
+        elif "Step3" in filename:
+            section_title = "💎 有料パート - STEP 3"
+        elif "Step4" in filename:
+            section_title = "💎 有料パート - STEP 4"
+        elif "Step5" in filename:
+            section_title = "💎 有料パート - STEP 5"
+        elif "Conclusion" in filename:
+            section_title = "💎 有料パート - 結論"
         else:
-            section_title = f"セクション {i+1}"
-        
-        # セクションヘッダーを追加
-        combined.append(f"\n\n{'='*60}\n{section_title}\n{'='*60}\n\n")
-        combined.append(content)
+            section_title = "💎 有料パート"
+    else:
+        section_title = f"セクション {i+1}"
     
-    return "".join(combined)
+    # セクションヘッダーを追加
+    return f"\n\n{'='*60}\n{section_title}\n{'='*60}\n\n" + content
+
+
+class DraftAssembler:
+    """
+    Phase 4で完成したセクション（NN_xxx.md）をその場で取り込む（Phase 4と並行して進むPhase 5の本文統合）
+
+    構成順に途切れず揃った分から 05_Final/final_article.md.part に書き足すので、
+    後ろのセクションがストリーミング中でも記事の前半を確認できる。
+    Phase 5は最後にドラフトの一覧と照合し、一致すれば取り込み済みの本文から記事を組み立てる
+    """
+
+    PREVIEW_NAME = "final_article.md.part"
+
+    def __init__(self, project_dir):
+        self.preview_file = Path(project_dir) / "05_Final" / self.PREVIEW_NAME
+        self.contents = {}   # ファイル -> 本文
+        self.by_index = {}   # セクション番号 -> ファイル
+        self.next_index = 1
+        self._lock = threading.Lock()
+
+    def add(self, index, text_file):
+        """完成したセクションを取り込む（phase4_writing.run_text_pipeline の on_section_done）"""
+        content = text_file.read_text(encoding="utf-8")
+        with self._lock:
+            self.contents[text_file] = content
+            self.by_index[index] = text_file
+            # 前のセクションがすべて揃っていれば、続きをプレビューに書き足す
+            blocks = []
+            while self.next_index in self.by_index:
+                path = self.by_index[self.next_index]
+                blocks.append(section_block(self.next_index - 1, path, self.contents[path]))
+                self.next_index += 1
+            if blocks:
+                self.preview_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.preview_file, "a" if self.next_index - len(blocks) > 1 else "w", encoding="utf-8") as f:
+                    f.write("".join(blocks))
+
+    def covers(self, text_files):
+        """取り込み済みのセクションがドラフトの一覧と一致するか（前回の実行で残ったファイルがあれば不一致）"""
+        with self._lock:
+            return bool(self.contents) and set(self.contents) == set(text_files)
+
+    def text(self, text_files):
+        with self._lock:
+            return integrate_texts(text_files, dict(self.contents))
 
 
 def parse_visual_map(visual_map_file):
@@ -434,10 +481,22 @@ def create_metadata(stats, output_file):
     return output_file
 
 
-def run(project_dir):
-    """Phase 5実行"""
+def run(project_dir, drafts=None):
+    """
+    Phase 5実行
+
+    Args:
+        drafts: Phase 4と並行して本文を取り込んだ DraftAssembler（なければドラフトを読み込む）
+    """
     print("  ├─ テキスト収集中...")
     draft_dir = project_dir / "03_Content_Draft"
+    
+    # ストリーミング中（または中断された）セクションがあるうちは記事にしない
+    partial_files = sorted(draft_dir.glob("*.md.part"))
+    if partial_files:
+        print(f"  ⚠️  書きかけのセクションがあります（{partial_files[0].name} など{len(partial_files)}件）。Phase 4を完了させてから実行してください")
+        return None
+    
     text_files = collect_text_files(draft_dir)
     
     if not text_files:
@@ -452,8 +511,12 @@ def run(project_dir):
     print(f"  │  └─ {len(all_images)}枚取得")
     
     print("  ├─ テキスト統合中...")
-    combined_text = integrate_texts(text_files)
-    print(f"  │  └─ {len(combined_text):,}文字")
+    if drafts and drafts.covers(text_files):
+        combined_text = drafts.text(text_files)
+        print(f"  │  └─ {len(combined_text):,}文字（Phase 4と並行して取り込み済み）")
+    else:
+        combined_text = integrate_texts(text_files)
+        print(f"  │  └─ {len(combined_text):,}文字")
     
     print("  ├─ 画像埋め込み中...")
     visual_map_file = project_dir / "02_Planning" / "visual_map.md"
@@ -468,6 +531,7 @@ def run(project_dir):
     print("  ├─ Markdown保存中...")
     final_md = final_dir / "final_article.md"
     final_md.write_text(final_markdown, encoding="utf-8")
+    (final_dir / DraftAssembler.PREVIEW_NAME).unlink(missing_ok=True)
     print(f"  │  └─ {final_md.name}")
     
     # HTML変換
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+プロバイダ別レート制限
+Claude / Gemini のリクエスト数をトークンバケットで制御する
+"""
+
+import threading
+import time
+
+
+# 1分あたりのリクエスト数（設定ファイルの rate_limits で上書き可能）
+DEFAULT_RATE_LIMITS = {
+    "claude": 50,
+    "gemini": 15,
+    "gemini_image": 10,
+}
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット"""
+
+    def __init__(self, requests_per_minute):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, requests_per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが1つ空くまで待機"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_limits = dict(DEFAULT_RATE_LIMITS)
+_share = 1
+
+
+def configure(rate_limits=None, share=1):
+    """
+    レート制限を設定
+
+    Args:
+        rate_limits: {"claude": 50, "gemini": 15, ...}（1分あたり。0以下で無制限）
+        share: 同じ枠を共有するプロセス数（batch_runnerの同時実行数）
+    """
+    global _limits, _share
+    with _buckets_lock:
+        _limits = dict(DEFAULT_RATE_LIMITS)
+        _limits.update(rate_limits or {})
+        _share = max(1, int(share or 1))
+        _buckets.clear()
+
+
+def acquire(provider):
+    """プロバイダの枠を1リクエスト分消費（空くまで待機）"""
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            rpm = _limits.get(provider)
+            if not rpm or rpm <= 0:
+                return
+            bucket = TokenBucket(rpm / _share)
+            _buckets[provider] = bucket
+    bucket.acquire()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+遅延importと起動プロファイル
+フェーズモジュールや重いSDKは実際に使うときに初めてimportし、その所要時間を記録する
+（master_generator --profile-startup で、Phase 1の前に起動時のimport、実行後にフェーズ実行中の遅延importを表示）
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+
+_records = []
+_lock = threading.Lock()
+
+
+def timed_import(name):
+    """モジュールをimport（初回のみ所要時間を記録）"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _records.append((name, elapsed))
+    return module
+
+
+def record(name, seconds):
+    """timed_import以外で計測した区間を記録"""
+    with _lock:
+        _records.append((name, seconds))
+
+
+def report(title="起動プロファイル（import時間）", start=0):
+    """
+    import時間の一覧を表示
+
+    Args:
+        title: 見出し
+        start: この件数より後の記録だけを表示（前回の report() 以降の分）
+
+    Returns:
+        表示した記録
+    """
+    with _lock:
+        records = _records[start:]
+    print(f"\n⏱️  {title}:")
+    if not records:
+        print("  （記録なし）")
+        return records
+    width = max(len(name) for name, _ in records)
+    for name, seconds in records:
+        print(f"  {name:<{width}}  {seconds * 1000:8.1f} ms")
+    print(f"  {'合計':<{width - 1}}  {sum(s for _, s in records) * 1000:8.1f} ms")
+    return records
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+"""
+テキスト生成の共通インターフェース
+プロバイダ（Claude / Gemini）を順番に並べたチェーンで生成し、エラー・タイムアウト時は次のプロバイダに切り替える
+hedge を有効にすると、1番手の応答が過去のレイテンシのp95を超えた時点で2番手にも同じリクエストを送り、
+先に返った方を使う（遅い1件がバッチ全体を待たせるのを防ぐ）
+
+batch_runner --batch-api では collecting() の中でフェーズを実行してリクエストだけを集め、
+バッチAPIの結果を preload() で入れてから通常どおり実行する（そのリクエストはAPIを呼ばずに結果を返す）
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+from . import clients, credentials, llm_cache, rate_limiter, transcript_text
+
+
+# 用途ごとの既定モデル（map-reduceの要約など、呼び出し側で models を渡せば上書き）
+DEFAULT_MODELS = {
+    "claude": "claude-sonnet-4-20250514",
+    "gemini": "models/gemini-2.0-flash",
+}
+
+# トークン使用量のキー（Claudeのusageと同じ名前）
+USAGE_KEYS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# 設定ファイルの text_generation で上書き可能
+DEFAULT_SETTINGS = {
+    "providers": None,       # 例: ["claude", "gemini"]。Noneなら prefer_gemini_for_text で順番を決める
+    "timeout_sec": 180,      # 1プロバイダあたりの待ち時間（ストリーミングでは最初・次のチャンクまで）。超えたら次のプロバイダへ
+    "hedge": False,
+    "hedge_percentile": 95,
+    "hedge_min_samples": 5,  # これだけレイテンシが集まるまではヘッジしない
+    "latency_window": 50,
+    "executor_workers": 16,  # 送信スレッド数（master_generator.configure_runtime が同時実行数から決める）
+}
+
+_settings = dict(DEFAULT_SETTINGS)
+_stats = {"calls": 0, "failovers": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0, "shared": 0, "batch_results": 0}
+_latencies = {}
+_inflight = {}
+_batch_results = {}
+_lock = threading.Lock()
+
+# collecting() 中のリクエスト収集先（フェーズのワーカースレッドにも copy_context で引き継がれる）
+_collector = contextvars.ContextVar("text_generation_collector", default=None)
+
+# track_batch_usage() の集計先（テーマごと。ワーカースレッドにも copy_context で引き継がれる）
+_batch_usage = contextvars.ContextVar("text_generation_batch_usage", default=None)
+
+# タイムアウト・ヘッジで待つのをやめたリクエストも最後まで走らせるため、呼び出し元とは別のスレッドで送る
+_executor = ThreadPoolExecutor(max_workers=DEFAULT_SETTINGS["executor_workers"], thread_name_prefix="text_generation")
+
+# レート制限の待ち・_executor の順番待ちの間は、送信されたかを確認するためにこの間隔で起きる
+SEND_POLL_SEC = 0.2
+
+
+def empty_usage():
+    return {key: 0 for key in USAGE_KEYS}
+
+
+def configure(settings=None):
+    """
+    設定を反映（レイテンシの履歴もクリア）
+
+    Args:
+        settings: {"providers": [...], "timeout_sec": float, "hedge": bool, "hedge_percentile": float, ...}
+    """
+    global _settings, _executor
+    with _lock:
+        _settings = dict(DEFAULT_SETTINGS)
+        _settings.update(settings or {})
+        _latencies.clear()
+        workers = max(1, int(_settings["executor_workers"]))
+        if workers != _executor._max_workers:
+            # 送信済みのリクエストは古い方で最後まで走らせる
+            _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="text_generation")
+
+
+class ClaudeProvider:
+    """Anthropic Messages API（system はプロンプトキャッシュの対象にする）"""
+
+    name = "claude"
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def build_request(model, prompt, system=None, max_tokens=4000):
+        """messages.create の引数（Message Batchesの params にもそのまま使う）"""
+        request = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+        }
+        if system:
+            request["system"] = [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ]
+        return request
+
+    def generate(self, model, prompt, system=None, max_tokens=4000, stream=None):
+        request = self.build_request(model, prompt, system, max_tokens)
+
+        if stream:
+            stream.begin()
+            with self.client.messages.stream(**request) as response_stream:
+                for chunk in response_stream.text_stream:
+                    stream.write(chunk)
+                response = response_stream.get_final_message()
+        else:
+            response = self.client.messages.create(**request)
+
+        usage = {key: getattr(response.usage, key, 0) or 0 for key in USAGE_KEYS}
+        if stream:
+            stream.commit(usage["output_tokens"])
+        return response.content[0].text, usage
+
+
+class GeminiProvider:
+    """Gemini generate_content（system は system_instruction で渡す）"""
+
+    name = "gemini"
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def build_config(system=None, max_tokens=None):
+        """generate_content の config（バッチのリクエストにもそのまま使う。max_tokens がNoneなら出力上限なし）"""
+        config = {}
+        if max_tokens:
+            config["max_output_tokens"] = max_tokens
+        if system:
+            config["system_instruction"] = system
+        return config or None
+
+    def generate(self, model, prompt, system=None, max_tokens=None, stream=None):
+        config = self.build_config(system, max_tokens)
+
+        if stream:
+            stream.begin()
+            parts = []
+            output_tokens = 0
+            for chunk in self.client.models.generate_content_stream(model=model, contents=prompt, config=config):
+                chunk_text = getattr(chunk, "text", None) or ""
+                stream.write(chunk_text)
+                parts.append(chunk_text)
+                usage_metadata = getattr(chunk, "usage_metadata", None)
+                output_tokens = getattr(usage_metadata, "candidates_token_count", None) or output_tokens
+            text = "".join(parts)
+            if text:
+                stream.commit(output_tokens or transcript_text.estimate_tokens(text))
+            return text, empty_usage()  # Geminiのトークン情報は未集計
+
+        response = self.client.models.generate_content(model=model, contents=prompt, config=config)
+        text = response.text if hasattr(response, "text") else response.candidates[0].content.parts[0].text
+        return text, empty_usage()  # Geminiのトークン情報は未集計
+
+
+def provider_chain(prefer_gemini=False):
+    """
+    APIキーとSDKがそろっているプロバイダを優先順に並べる
+
+    Args:
+        prefer_gemini: 設定の providers がないときにGeminiを1番手にするか
+
+    Returns:
+        [ClaudeProvider / GeminiProvider]（使えるものがなければ空）
+    """
+    order = _settings.get("providers") or (["gemini", "claude"] if prefer_gemini else ["claude", "gemini"])
+    chain = []
+    for name in order:
+        key = credentials.get_api_key(name)
+        if not key or not credentials.sdk_available(name):
+            continue
+        if name == "claude":
+            chain.append(ClaudeProvider(clients.get_claude_client(key)))
+        elif name == "gemini":
+            chain.append(GeminiProvider(clients.get_gemini_client(key)))
+    return chain
+
+
+def describe(chain):
+    """ログ用の表記（例: Claude → Gemini）"""
+    return " → ".join(provider.name.capitalize() for provider in chain)
+
+
+def _latency_key(provider, model, max_tokens):
+    # 同じモデルでも用途（出力上限）が違えばレイテンシの分布が違うので分けて集計する
+    return (provider.name, model, max_tokens)
+
+
+def _record_latency(key, seconds):
+    with _lock:
+        if key not in _latencies:
+            _latencies[key] = deque(maxlen=_settings["latency_window"])
+        _latencies[key].append(seconds)
+
+
+def latency_percentile(key, percentile=None):
+    """過去のレイテンシのパーセンタイル（サンプル不足ならNone）"""
+    with _lock:
+        samples = sorted(_latencies.get(key, ()))
+    if len(samples) < max(1, _settings["hedge_min_samples"]):
+        return None
+    percentile = _settings["hedge_percentile"] if percentile is None else percentile
+    index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return samples[index]
+
+
+def _count(name, n=1):
+    with _lock:
+        _stats[name] += n
+
+
+def _cache_prompt(prompt, system):
+    return [system, prompt] if system else prompt
+
+
+def output_limit(provider_name, max_tokens, limit_gemini=False):
+    """
+    プロバイダに渡す出力上限
+
+    Claudeは max_tokens が必須。Geminiは従来どおり上限なしで、limit_gemini のときだけ max_tokens で打ち切る
+    （構成プランのJSONや本文が途中で切れないように）
+    """
+    if provider_name == "gemini" and not limit_gemini:
+        return None
+    return max_tokens
+
+
+def generate(chain, prompt, system=None, max_tokens=4000, models=None, validate=None, stream=None, label="",
+             limit_gemini=False):
+    """
+    チェーンの順にテキストを生成
+
+    Args:
+        chain: provider_chain() の戻り値
+        system: 共通部分（Claudeではプロンプトキャッシュ、Geminiではsystem_instruction）
+        models: プロバイダ名→モデル（省略時は DEFAULT_MODELS）
+        validate: 応答を検証する関数（例外を投げたら失敗として次のプロバイダへ）
+        stream: phase4_writing.DraftStream（ストリーミングでは同じファイルに書くためヘッジしない）
+        label: ログ用の呼び出し名
+        limit_gemini: Geminiにも max_tokens の出力上限をかける（チャンク要約など短い応答でよい呼び出し）
+
+    Returns:
+        {"text", "provider", "usage", "seconds"}（すべて失敗したら text はNone）
+    """
+    models = dict(DEFAULT_MODELS, **(models or {}))
+    params = {"max_tokens": max_tokens}
+    cache_prompt = _cache_prompt(prompt, system)
+    started = time.monotonic()
+
+    # バッチAPIで取得済みの結果（トークン数はバッチの応答を、使うテーマ数で按分したもの）
+    for provider in chain:
+        preloaded = _batch_results.get(batch_key(provider.name, models[provider.name], prompt, system, max_tokens))
+        if preloaded and _is_valid(preloaded["text"], validate):
+            usage = {key: round(value / preloaded["users"]) for key, value in preloaded["usage"].items()}
+            _record_batch_usage(models[provider.name], usage)
+            return {"text": preloaded["text"], "provider": provider.name, "usage": usage, "seconds": 0.0}
+
+    # 以前のフェイルオーバーで2番手が返した結果も再利用する
+    for provider in chain:
+        cached = llm_cache.get(provider.name, models[provider.name], cache_prompt, params)
+        if cached and _is_valid(cached["text"], validate):
+            return {"text": cached["text"], "provider": provider.name, "usage": empty_usage(), "seconds": 0.0}
+
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(chain[0].name, models[chain[0].name], prompt, system, max_tokens,
+                      output_limit(chain[0].name, max_tokens, limit_gemini))
+        return {"text": None, "provider": None, "usage": empty_usage(), "seconds": 0.0}
+
+    if stream:
+        return _generate_sequential(chain, prompt, system, max_tokens, models, validate, stream, label, started,
+                                    limit_gemini)
+
+    # 同じリクエストが実行中（batch --in-process で同じキーワードのテーマが重なった場合など）ならその結果を待つ
+    flight_key = llm_cache.make_key([provider.name for provider in chain], models, cache_prompt, params)
+    with _lock:
+        shared = _inflight.get(flight_key)
+        if shared is None:
+            owner = _inflight[flight_key] = Future()
+    if shared is not None:
+        _count("shared")
+        return dict(shared.result(), usage=empty_usage())
+
+    try:
+        result = _generate_hedged(chain, prompt, system, max_tokens, models, validate, label, started, limit_gemini)
+        owner.set_result(result)
+        return result
+    except BaseException as e:
+        owner.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(flight_key, None)
+
+
+def _is_valid(text, validate):
+    if not text:
+        return False
+    if validate is None:
+        return True
+    try:
+        validate(text)
+        return True
+    except Exception:
+        return False
+
+
+class Abandoned(Exception):
+    """レート制限の枠を待っている間に不要になった（送信しない）"""
+
+
+class Attempt:
+    """
+    1プロバイダへの1リクエスト
+
+    タイムアウト・ヘッジ・レイテンシは sent（レート制限の枠を取って送信した時刻）から測る。
+    ローカルの順番待ちをプロバイダの遅さとみなすと、送る前にタイムアウトして
+    次のプロバイダにも送ってしまう（同じプロンプトに2回課金される）
+    """
+
+    def __init__(self, provider, model, max_tokens, is_hedge=False):
+        self.provider = provider
+        self.model = model
+        self.max_tokens = max_tokens  # output_limit() 済み（GeminiはNoneなら上限なし）
+        self.is_hedge = is_hedge
+        self.sent = None
+        self.abandoned = False
+
+    def start(self):
+        """レート制限の枠を取って送信時刻を記録（待っている間に abandon() されていたら Abandoned）"""
+        rate_limiter.acquire(self.provider.name)
+        with _lock:
+            if self.abandoned:
+                raise Abandoned()
+            self.sent = time.monotonic()
+
+    def abandon(self):
+        """まだ送信していなければ送らない（送信済みなら接続は裏で完了させる）"""
+        with _lock:
+            self.abandoned = True
+
+
+def _call(attempt, prompt, system, max_tokens, validate, stream=None):
+    """1プロバイダへの1リクエスト（検証に通らない応答は例外にする）"""
+    attempt.start()
+    text, usage = attempt.provider.generate(attempt.model, prompt, system=system, max_tokens=attempt.max_tokens, stream=stream)
+    if not text:
+        raise ValueError("空の応答")
+    if validate:
+        validate(text)
+    return text, usage
+
+
+def _succeeded(attempt, prompt, system, max_tokens, text, usage, started):
+    provider, model = attempt.provider, attempt.model
+    _record_latency(_latency_key(provider, model, max_tokens), time.monotonic() - attempt.sent)
+    llm_cache.put(provider.name, model, _cache_prompt(prompt, system), {"text": text}, {"max_tokens": max_tokens})
+    return {"text": text, "provider": provider.name, "usage": usage, "seconds": time.monotonic() - started}
+
+
+class StreamStalled(Exception):
+    """待つのをやめたストリームへの書き込み（次のプロバイダが同じファイルに書き直している）"""
+
+
+class GuardedStream:
+    """
+    1回の試行分のストリーム書き込み口（phase4_writing.DraftStream をラップ）
+
+    最後に進んだ時刻（送信・チャンク受信）を記録し、cancel() の後の書き込み・完了は StreamStalled にする
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.last_activity = None  # begin() 前（レート制限の待ち）はNone
+        self.committed = False
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def _touch(self):
+        if self.cancelled:
+            raise StreamStalled()
+        self.last_activity = time.monotonic()
+
+    def begin(self):
+        with self.lock:
+            self._touch()
+            self.stream.begin()
+
+    def write(self, chunk):
+        with self.lock:
+            self._touch()
+            self.stream.write(chunk)
+
+    def commit(self, output_tokens):
+        with self.lock:
+            self._touch()
+            self.stream.commit(output_tokens)
+            self.committed = True
+
+    def cancel(self):
+        """以降の書き込みを止める（すでに完了していたらFalse）"""
+        with self.lock:
+            if self.committed:
+                return False
+            self.cancelled = True
+            return True
+
+
+def _wait_stream(future, guard, timeout_sec):
+    """最初のチャンク・次のチャンクが timeout_sec 来なければ待つのをやめる（送信前の待ちは数えない）"""
+    while True:
+        try:
+            return future.result(timeout=SEND_POLL_SEC)
+        except FutureTimeoutError:
+            pass
+        last_activity = guard.last_activity
+        if last_activity is not None and time.monotonic() - last_activity >= timeout_sec and guard.cancel():
+            _count("timeouts")
+            raise TimeoutError(f"ストリームが{timeout_sec}秒止まったためタイムアウト")
+
+
+def _generate_sequential(chain, prompt, system, max_tokens, models, validate, stream, label, started, limit_gemini=False):
+    """ストリーミング用: 失敗・停止したら書きかけを捨てて次のプロバイダで書き直す"""
+    _count("calls")
+    timeout_sec = _settings["timeout_sec"]
+    for position, provider in enumerate(chain):
+        attempt = Attempt(provider, models[provider.name], output_limit(provider.name, max_tokens, limit_gemini))
+        guard = GuardedStream(stream)
+        # 止まったストリームを待たずに次へ進めるよう、受信は _executor のスレッドで行う
+        future = _executor.submit(
+            contextvars.copy_context().run, _call, attempt, prompt, system, max_tokens, validate, guard
+        )
+        try:
+            text, usage = _wait_stream(future, guard, timeout_sec)
+            return _succeeded(attempt, prompt, system, max_tokens, text, usage, started)
+        except Exception as e:
+            attempt.abandon()
+            stream.discard()
+            _report_failure(provider, chain[position + 1:], label, str(e))
+    return {"text": None, "provider": None, "usage": empty_usage(), "seconds": time.monotonic() - started}
+
+
+def _report_failure(provider, remaining, label, reason):
+    print(f"    ❌ {provider.name}エラー{f'（{label}）' if label else ''}: {reason[:200]}")
+    if remaining:
+        _count("failovers")
+        print(f"    🔀 {remaining[0].name} に切り替えます")
+
+
+def _abandon(attempts, max_tokens):
+    """
+    待つのをやめたリクエスト: 未送信なら送らない。送信済みなら完了したときにレイテンシだけ記録する
+    （遅い応答を履歴から落とさない）
+    """
+    for future, attempt in attempts.items():
+        attempt.abandon()
+
+        def record(done, attempt=attempt):
+            if done.exception() is None:
+                _record_latency(_latency_key(attempt.provider, attempt.model, max_tokens), time.monotonic() - attempt.sent)
+        future.add_done_callback(record)
+
+
+def _generate_hedged(chain, prompt, system, max_tokens, models, validate, label, started, limit_gemini=False):
+    """フェイルオーバー + ヘッジ（先に成功した応答を使い、残りは結果を捨てる）"""
+    _count("calls")
+    queue = list(chain)
+    running = {}  # future -> Attempt
+    hedged = False
+    timeout_sec = _settings["timeout_sec"]
+
+    def launch(is_hedge=False):
+        provider = queue.pop(0)
+        attempt = Attempt(provider, models[provider.name], output_limit(provider.name, max_tokens, limit_gemini), is_hedge)
+        # copy_context: batch_runner --in-process のテーマ別ログ出力先を引き継ぐ
+        future = _executor.submit(
+            contextvars.copy_context().run, _call, attempt, prompt, system, max_tokens, validate
+        )
+        running[future] = attempt
+
+    launch()
+    while running:
+        now = time.monotonic()
+        # 未送信（レート制限・スレッドの順番待ち）のリクエストは送信されるまで時計を止めておく
+        sent_times = [attempt.sent for attempt in running.values()]
+        wake_at = min((sent + timeout_sec if sent is not None else now + SEND_POLL_SEC) for sent in sent_times)
+        hedge_at = None
+        if _settings["hedge"] and queue and not hedged and len(running) == 1:
+            primary = next(iter(running.values()))
+            threshold = latency_percentile(_latency_key(primary.provider, primary.model, max_tokens))
+            if threshold is not None and primary.sent is not None:
+                hedge_at = primary.sent + threshold
+                wake_at = min(wake_at, hedge_at)
+
+        done, _ = wait(list(running), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt = running.pop(future)
+            try:
+                text, usage = future.result()
+            except Exception as e:
+                _report_failure(attempt.provider, queue if not running else [], label, str(e))
+                if queue and not running:
+                    launch()
+                continue
+            if attempt.is_hedge:
+                _count("hedge_wins")
+            _abandon(running, max_tokens)
+            return _succeeded(attempt, prompt, system, max_tokens, text, usage, started)
+        if done:
+            continue
+
+        now = time.monotonic()
+        for future, attempt in list(running.items()):
+            if attempt.sent is not None and now - attempt.sent >= timeout_sec:
+                # 応答は待たない（接続は裏で完了させる）
+                running.pop(future)
+                _abandon({future: attempt}, max_tokens)
+                _count("timeouts")
+                _report_failure(attempt.provider, queue if not running else [], label, f"{timeout_sec}秒でタイムアウト")
+                if queue and not running:
+                    launch()
+        if hedge_at is not None and now >= hedge_at and queue and primary in running.values():
+            hedged = True
+            _count("hedges")
+            print(f"    🪁 {primary.provider.name}の応答が過去のp{_settings['hedge_percentile']:g}（{threshold:.1f}秒）を超えたため"
+                  f" {queue[0].name} にも送信{f'（{label}）' if label else ''}")
+            launch(is_hedge=True)
+
+    return {"text": None, "provider": None, "usage": empty_usage(), "seconds": time.monotonic() - started}
+
+
+def batch_key(provider_name, model, prompt, system, max_tokens):
+    """バッチ結果のキー（LLMキャッシュと同じ計算）"""
+    return llm_cache.make_key(provider_name, model, _cache_prompt(prompt, system), {"max_tokens": max_tokens})
+
+
+class Collector:
+    """collecting() 中に送られるはずだったリクエスト"""
+
+    def __init__(self):
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def add(self, provider_name, model, prompt, system, max_tokens, limit):
+        key = batch_key(provider_name, model, prompt, system, max_tokens)
+        with self._lock:
+            if key in self.requests:
+                self.requests[key]["users"] += 1
+                return
+            self.requests[key] = {
+                "key": key,
+                "provider": provider_name,
+                "model": model,
+                "prompt": prompt,
+                "system": system,
+                "max_tokens": max_tokens,
+                "output_limit": limit,  # バッチのリクエストに入れる出力上限（output_limit()）
+                "users": 1,             # この結果を使う呼び出しの数（トークン数・コストの按分に使う）
+            }
+
+    def merge_into(self, requests):
+        """
+        テーマごとの収集結果を1つにまとめる（同じリクエストは1件だけ送り、users を足す）
+
+        Args:
+            requests: {key: request}（このコレクターの分を追加する）
+        """
+        for key, request in self.requests.items():
+            if key in requests:
+                requests[key]["users"] += request["users"]
+            else:
+                requests[key] = dict(request)
+
+
+@contextmanager
+def collecting():
+    """
+    この中の generate() はAPIを呼ばず、1番手のプロバイダへのリクエストを記録して失敗扱いで返す
+    （バッチ結果・LLMキャッシュにあるものは記録しない）
+    """
+    collector = Collector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def pending():
+    """collecting() 中に結果待ちのリクエストがあるか（後続のプロンプトがその結果に依存する場合に処理を打ち切る）"""
+    collector = _collector.get()
+    return bool(collector and collector.requests)
+
+
+def preload(requests, results):
+    """
+    バッチAPIの結果を登録（LLMキャッシュにも書く）
+
+    Args:
+        requests: Collector.requests の値
+        results: {key: {"text", "usage"}}
+    """
+    for request in requests:
+        result = results.get(request["key"])
+        if not result or not result["text"]:
+            continue
+        with _lock:
+            _batch_results[request["key"]] = dict(result, users=request.get("users", 1))
+        llm_cache.put(request["provider"], request["model"], _cache_prompt(request["prompt"], request["system"]),
+                      {"text": result["text"]}, {"max_tokens": request["max_tokens"]})
+
+
+def track_batch_usage():
+    """
+    このコンテキスト（1テーマの実行）でバッチAPIの結果から返したトークン数の集計を始める
+
+    Returns:
+        {model: usage}（generate() がバッチの結果を返すたびに按分後のトークン数を足す）
+    """
+    usage_by_model = {}
+    _batch_usage.set(usage_by_model)
+    return usage_by_model
+
+
+def _record_batch_usage(model, usage):
+    usage_by_model = _batch_usage.get()
+    with _lock:
+        _stats["batch_results"] += 1
+        if usage_by_model is not None:
+            totals = usage_by_model.setdefault(model, empty_usage())
+            for key in USAGE_KEYS:
+                totals[key] += usage.get(key, 0)
+
+
+def stats():
+    """呼び出し・フェイルオーバー・ヘッジの回数"""
+    with _lock:
+        return dict(_stats)
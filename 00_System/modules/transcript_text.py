@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+字幕テキストの正規化
+自動生成字幕の重複（ローリング表示の繰り返し）・改行トークン・フィラーを取り除き、
+動画ごとのトークン予算に収まるよう動画全体から文を間引いて詰める
+"""
+
+import re
+
+
+# 字幕に混ざる効果音などのタグ
+TAG_PATTERN = re.compile(r"[\[［(（](?:音楽|拍手|笑|笑い|歓声|Music|Applause|Laughter)[\]］)）]", re.IGNORECASE)
+
+# 単独で現れるフィラー（前後が区切りのときだけ削除）
+FILLERS = [
+    "えーっと", "えっと", "えーと", "えー", "ええと",
+    "あのー", "あの", "そのー", "まあ", "まぁ",
+    "うーん", "うん", "なんか", "ええ", "はい",
+]
+FILLER_PATTERN = re.compile(
+    r"(?:(?<=^)|(?<=[\s、。！？]))(?:" + "|".join(sorted(FILLERS, key=len, reverse=True)) + r")[ー〜～]*(?=[\s、。！？]|$)"
+)
+
+CJK = r"　-〿぀-ヿ㐀-鿿！-｠"
+SENTENCE_END = re.compile(r"(?<=[。！？!?])")
+
+# ローリング字幕の繰り返しとみなす断片数（最短・最長）
+REPEAT_MIN_FRAGMENTS = 3
+REPEAT_MAX_FRAGMENTS = 40
+PACK_SEPARATOR = " … "
+
+
+def collapse_repeats(fragments):
+    """ローリング字幕で繰り返される断片の並び（直前と同じ並び）を落とす"""
+    kept = []
+    i = 0
+    while i < len(fragments):
+        fragment = fragments[i]
+        if kept and fragment == kept[-1]:
+            i += 1
+            continue
+        # 直前に出力した末尾の並びがそのまま繰り返されていれば飛ばす（長い一致を優先）
+        skip = 0
+        longest = min(len(kept), len(fragments) - i, REPEAT_MAX_FRAGMENTS)
+        for length in range(longest, REPEAT_MIN_FRAGMENTS - 1, -1):
+            if fragments[i] == kept[-length] and fragments[i:i + length] == kept[-length:]:
+                skip = length
+                break
+        if skip:
+            i += skip
+            continue
+        kept.append(fragment)
+        i += 1
+    return kept
+
+
+def normalize(text):
+    """字幕テキストを正規化"""
+    if not text:
+        return ""
+    text = text.replace("\\n", " ").replace("\n", " ")
+    text = TAG_PATTERN.sub(" ", text)
+    fragments = collapse_repeats(text.split())
+    text = " ".join(fragments)
+    text = FILLER_PATTERN.sub("", text)
+    # 日本語の断片どうしの間の空白は字幕の区切りなので詰める
+    text = re.sub(rf"(?<=[{CJK}])\s+(?=[{CJK}])", "", text)
+    text = re.sub(r"\s+", " ", text)
+    # フィラーを消した跡に残る句読点
+    text = re.sub(r"[、。]+(?=[、。])", "", text)
+    text = re.sub(r"^[\s、。]+", "", text)
+    return text.strip()
+
+
+def estimate_tokens(text):
+    """トークン数の概算（日本語は1文字≒1トークン、英数字は4文字≒1トークン）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + -(-ascii_chars // 4)
+
+
+def split_sentences(text, max_chars=120):
+    """句点で文に分ける（句点のない字幕は max_chars ごとに区切る）"""
+    sentences = []
+    for part in SENTENCE_END.split(text):
+        part = part.strip()
+        while len(part) > max_chars:
+            sentences.append(part[:max_chars])
+            part = part[max_chars:]
+        if part:
+            sentences.append(part)
+    return sentences
+
+
+def pack(text, token_budget):
+    """
+    トークン予算に収める
+
+    予算を超える場合は先頭だけを切り出さず、動画全体から等間隔に文を選んで順番どおりに並べる
+    """
+    if not token_budget or estimate_tokens(text) <= token_budget:
+        return text
+    sentences = split_sentences(text)
+    separator_cost = estimate_tokens(PACK_SEPARATOR)
+    total = sum(estimate_tokens(s) + separator_cost for s in sentences)
+    ratio = token_budget / total
+
+    kept = []
+    used = 0
+    carry = 1.0  # 冒頭の文は必ず残す
+    for sentence in sentences:
+        if carry < 1:
+            carry += ratio
+            continue
+        carry += ratio - 1
+        cost = estimate_tokens(sentence) + (separator_cost if kept else 0)
+        if used + cost > token_budget:
+            break
+        kept.append(sentence)
+        used += cost
+    return PACK_SEPARATOR.join(kept) if kept else text[:token_budget]
+
+
+def chunk(text, token_budget):
+    """文の区切りで token_budget ごとのチャンクに分ける（map-reduce抽出用）"""
+    chunks = []
+    current = []
+    used = 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence)
+        if current and used + cost > token_budget:
+            chunks.append("".join(current))
+            current = []
+            used = 0
+        current.append(sentence)
+        used += cost
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def prepare(text, token_budget=None):
+    """正規化 + 予算内に詰める"""
+    return pack(normalize(text), token_budget)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+YouTube検索・字幕取得のバックエンド
+- LibraryBackend: yt_dlp をライブラリとして使う（プロセス起動・JSONの受け渡し・一時ファイルなし）
+- SubprocessBackend: yt-dlpコマンドを実行（yt_dlpをimportできない環境向け）
+- FixtureBackend: 記録済みの --dump-json 出力とjson3字幕を再生（オフラインのテスト・ベンチマーク用）
+
+どのバックエンドも search(keyword, max_results) と transcript(video_id) を持つ
+"""
+
+from pathlib import Path
+import importlib.util
+import json
+import subprocess
+import tempfile
+import threading
+import time
+
+from . import startup_profile, ytdlp_locator
+
+
+SUBTITLE_LANG = "ja"
+SUBTITLE_FORMAT = "json3"
+TIMEOUT_SEC = 30
+
+
+def caption_formats(info, lang=SUBTITLE_LANG):
+    """
+    使える字幕のフォーマット一覧（手動字幕を優先）
+
+    automatic_captions には他の言語からの機械翻訳も lang として並ぶので、
+    自動生成字幕は動画の元の言語が lang のとき（language または "<lang>-orig" の字幕）だけ使う
+    """
+    manual = (info.get('subtitles') or {}).get(lang)
+    if manual:
+        return manual
+    automatic = info.get('automatic_captions') or {}
+    if info.get('language') == lang or f"{lang}-orig" in automatic:
+        return automatic.get(lang) or automatic.get(f"{lang}-orig") or []
+    return []
+
+
+def has_captions(info, lang=SUBTITLE_LANG):
+    """
+    動画情報に字幕（手動字幕、または元の言語の自動生成字幕）があるか
+
+    Returns:
+        True/False。字幕情報自体がない場合（フラット検索など）はNone
+    """
+    if 'subtitles' not in info and 'automatic_captions' not in info:
+        return None
+    return bool(caption_formats(info, lang))
+
+
+def video_summary(info):
+    """yt-dlpの動画情報からPhase 2で使う項目だけを取り出す"""
+    return {
+        'title': info.get('title', ''),
+        'id': info.get('id', ''),
+        'link': f"https://www.youtube.com/watch?v={info.get('id', '')}",
+        'duration': str(info.get('duration', 0)),
+        'views': str(info.get('view_count', 'N/A')),
+        'has_captions': has_captions(info)
+    }
+
+
+def parse_json3(subtitle_data):
+    """json3形式の字幕をテキストにする"""
+    if 'events' not in subtitle_data:
+        return None
+    texts = []
+    for event in subtitle_data['events']:
+        for seg in event.get('segs', []):
+            if 'utf8' in seg:
+                texts.append(seg['utf8'])
+    return " ".join(texts)
+
+
+class SubprocessBackend:
+    """yt-dlpコマンド + --dump-json / 一時ディレクトリ経由の字幕"""
+
+    name = "subprocess"
+
+    def __init__(self, ytdlp_cmd):
+        self.ytdlp_cmd = ytdlp_cmd
+
+    def search(self, keyword, max_results):
+        cmd = [
+            self.ytdlp_cmd,
+            "--dump-json",
+            "--skip-download",
+            "--no-warnings",
+            f"ytsearch{max_results}:{keyword}"
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=TIMEOUT_SEC)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+
+        videos = []
+        for line in result.stdout.strip().split('\n'):
+            if line:
+                try:
+                    videos.append(video_summary(json.loads(line)))
+                except ValueError:
+                    continue
+        return videos
+
+    def transcript(self, video_id):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cmd = [
+                self.ytdlp_cmd,
+                "--write-sub",
+                "--write-auto-sub",
+                "--sub-lang", SUBTITLE_LANG,
+                "--skip-download",
+                "--sub-format", SUBTITLE_FORMAT,
+                "-o", f"{tmpdir}/subtitle",
+                "--no-warnings",
+                f"https://www.youtube.com/watch?v={video_id}"
+            ]
+            subprocess.run(cmd, capture_output=True, text=True, timeout=TIMEOUT_SEC)
+
+            subtitle_files = list(Path(tmpdir).glob(f"*.{SUBTITLE_LANG}.{SUBTITLE_FORMAT}"))
+            if not subtitle_files:
+                return None
+            with open(subtitle_files[0], 'r', encoding='utf-8') as f:
+                return parse_json3(json.load(f))
+
+
+class LibraryBackend:
+    """yt_dlp.YoutubeDL（字幕はメモリ上で取得）"""
+
+    name = "library"
+
+    def __init__(self):
+        self.yt_dlp = startup_profile.timed_import("yt_dlp")
+        # YoutubeDLはスレッドセーフではないため、字幕の並列取得ではワーカースレッドごとに1つ作る
+        # （同じスレッド内では検索と字幕取得で同じインスタンスを使い回す）
+        self._local = threading.local()
+
+    def _ydl(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = self.yt_dlp.YoutubeDL({
+                "quiet": True,
+                "no_warnings": True,
+                "skip_download": True,
+                "socket_timeout": TIMEOUT_SEC,
+            })
+            self._local.ydl = ydl
+        return ydl
+
+    def search(self, keyword, max_results):
+        info = self._ydl().extract_info(f"ytsearch{max_results}:{keyword}", download=False)
+        return [video_summary(entry) for entry in (info or {}).get('entries') or [] if entry]
+
+    def transcript(self, video_id):
+        ydl = self._ydl()
+        info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+        # 手動字幕を優先し、なければ元の言語の自動生成字幕（機械翻訳の字幕は使わない）
+        for fmt in caption_formats(info or {}):
+            if fmt.get('ext') == SUBTITLE_FORMAT and fmt.get('url'):
+                with ydl.urlopen(fmt['url']) as response:
+                    return parse_json3(json.loads(response.read().decode('utf-8')))
+        return None
+
+
+class FixtureBackend:
+    """
+    記録済みデータを再生するバックエンド
+
+    fixture_dir/
+        search.jsonl                 yt-dlp --dump-json の出力（1行1動画）
+        subtitles/<video_id>.ja.json3  yt-dlp --write-auto-sub --sub-format json3 の出力
+    """
+
+    name = "fixture"
+
+    def __init__(self, fixture_dir, delay_sec=0):
+        self.fixture_dir = Path(fixture_dir)
+        # ネットワーク待ちを模擬する1リクエストあたりの遅延
+        self.delay_sec = delay_sec
+
+    def search(self, keyword, max_results):
+        time.sleep(self.delay_sec)
+        videos = []
+        with open(self.fixture_dir / "search.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    videos.append(video_summary(json.loads(line)))
+                if len(videos) >= max_results:
+                    break
+        return videos
+
+    def transcript(self, video_id):
+        time.sleep(self.delay_sec)
+        path = self.fixture_dir / "subtitles" / f"{video_id}.{SUBTITLE_LANG}.{SUBTITLE_FORMAT}"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return parse_json3(json.load(f))
+
+
+def record_fixture(keyword, max_results, fixture_dir):
+    """
+    yt-dlpコマンドで検索・字幕を取得し、FixtureBackend用にそのまま保存
+
+    Returns:
+        記録できた字幕の本数
+    """
+    fixture_dir = Path(fixture_dir)
+    (fixture_dir / "subtitles").mkdir(parents=True, exist_ok=True)
+    ytdlp_cmd, _ = ytdlp_locator.find_ytdlp()
+    if not ytdlp_cmd:
+        raise RuntimeError("yt-dlpが見つかりません")
+
+    result = subprocess.run(
+        [ytdlp_cmd, "--dump-json", "--skip-download", "--no-warnings", f"ytsearch{max_results}:{keyword}"],
+        capture_output=True, text=True, timeout=TIMEOUT_SEC * 4,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    (fixture_dir / "search.jsonl").write_text(result.stdout, encoding="utf-8")
+
+    recorded = 0
+    for line in result.stdout.splitlines():
+        if not line.strip():
+            continue
+        video_id = json.loads(line).get("id")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            subprocess.run(
+                [ytdlp_cmd, "--write-sub", "--write-auto-sub", "--sub-lang", SUBTITLE_LANG, "--skip-download",
+                 "--sub-format", SUBTITLE_FORMAT, "-o", f"{tmpdir}/subtitle", "--no-warnings",
+                 f"https://www.youtube.com/watch?v={video_id}"],
+                capture_output=True, text=True, timeout=TIMEOUT_SEC,
+            )
+            for subtitle_file in Path(tmpdir).glob(f"*.{SUBTITLE_LANG}.{SUBTITLE_FORMAT}"):
+                target = fixture_dir / "subtitles" / f"{video_id}.{SUBTITLE_LANG}.{SUBTITLE_FORMAT}"
+                target.write_bytes(subtitle_file.read_bytes())
+                recorded += 1
+                break
+    return recorded
+
+
+_backends = {}
+_lock = threading.Lock()
+
+
+def get_backend(preference="auto"):
+    """
+    バックエンドを返す（プロセス内で使い回す）
+
+    Args:
+        preference: "auto"（yt_dlpをimportできればlibrary）/ "library" / "subprocess" / "fixture:<ディレクトリ>"
+
+    Returns:
+        バックエンド。yt-dlpが使えなければNone
+    """
+    with _lock:
+        if preference not in _backends:
+            _backends[preference] = _create(preference)
+        return _backends[preference]
+
+
+def _create(preference):
+    if preference.startswith("fixture:"):
+        return FixtureBackend(Path(preference.split(":", 1)[1]).expanduser())
+    if preference in ("auto", "library") and importlib.util.find_spec("yt_dlp") is not None:
+        return LibraryBackend()
+    if preference == "library":
+        print("    ⚠️  yt_dlpをimportできないためyt-dlpコマンドを使います")
+    ytdlp_cmd, _ = ytdlp_locator.find_ytdlp()
+    return SubprocessBackend(ytdlp_cmd) if ytdlp_cmd else None
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+YouTube字幕ストア
+取得した字幕を動画ID・言語ごとにSQLiteへ保存し（本文はzlib圧縮）、
+同じ動画を別のテーマで使うときはダウンロードせずに読み出す
+検索結果もキーワード・件数ごとにTTL付きで保存する
+
+検索キャッシュの削除:
+    python -m modules.youtube_store clear-search [--keyword "Threads 稼ぐ方法"]
+"""
+
+from pathlib import Path
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+DEFAULT_STORE_PATH = Path.home() / ".cache" / "brain_content_system" / "youtube.sqlite3"
+
+# 設定ファイルの youtube_store で上書き可能
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "path": str(DEFAULT_STORE_PATH),
+    "search_ttl_hours": 24,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    text BLOB NOT NULL,
+    chars INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (video_id, lang)
+);
+CREATE TABLE IF NOT EXISTS searches (
+    keyword TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    results TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (keyword, max_results)
+);
+"""
+
+_settings = dict(DEFAULT_SETTINGS)
+_stats = {"hits": 0, "misses": 0, "writes": 0, "search_hits": 0, "search_misses": 0}
+_lock = threading.Lock()
+
+
+def configure(settings=None):
+    """
+    ストア設定を反映
+
+    Args:
+        settings: {"enabled": bool, "path": str, "search_ttl_hours": float}
+    """
+    global _settings
+    with _lock:
+        _settings = dict(DEFAULT_SETTINGS)
+        _settings.update(settings or {})
+
+
+def is_enabled():
+    return bool(_settings.get("enabled"))
+
+
+def store_path():
+    return Path(_settings["path"]).expanduser()
+
+
+def _connect():
+    """接続を開く（バッチの複数プロセスから同時に使うためWALモード）"""
+    path = store_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def get_transcript(video_id, lang):
+    """保存済みの字幕を返す（なければNone）"""
+    if not is_enabled():
+        return None
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT text FROM transcripts WHERE video_id = ? AND lang = ?", (video_id, lang)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"    ⚠️  字幕ストア読み込み失敗: {e}")
+        return None
+
+    if row is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return zlib.decompress(row[0]).decode("utf-8")
+
+
+def put_transcript(video_id, lang, text):
+    """字幕を保存（同じ動画・言語は上書き）"""
+    if not is_enabled() or not text:
+        return
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO transcripts (video_id, lang, text, chars, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (video_id, lang, zlib.compress(text.encode("utf-8")), len(text), time.time()),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"    ⚠️  字幕ストア書き込み失敗: {e}")
+        return
+    _count("writes")
+
+
+def get_search(keyword, max_results):
+    """期限内の検索結果を返す（なければNone）"""
+    if not is_enabled():
+        return None
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT results, fetched_at FROM searches WHERE keyword = ? AND max_results = ?",
+                (keyword, max_results),
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"    ⚠️  検索キャッシュ読み込み失敗: {e}")
+        return None
+
+    ttl_sec = float(_settings.get("search_ttl_hours") or 0) * 3600
+    if row is None or (ttl_sec and time.time() - row[1] > ttl_sec):
+        _count("search_misses")
+        return None
+    _count("search_hits")
+    return json.loads(row[0])
+
+
+def put_search(keyword, max_results, videos):
+    """検索結果を保存（0件は保存しない）"""
+    if not is_enabled() or not videos:
+        return
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO searches (keyword, max_results, results, fetched_at) VALUES (?, ?, ?, ?)",
+                    (keyword, max_results, json.dumps(videos, ensure_ascii=False), time.time()),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"    ⚠️  検索キャッシュ書き込み失敗: {e}")
+
+
+def clear_search(keyword=None):
+    """検索キャッシュを削除（keyword指定時はそのキーワードだけ）。削除した件数を返す"""
+    conn = _connect()
+    try:
+        with conn:
+            if keyword is None:
+                cursor = conn.execute("DELETE FROM searches")
+            else:
+                cursor = conn.execute("DELETE FROM searches WHERE keyword = ?", (keyword,))
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def stats():
+    """ヒット/ミスなどのカウンタ"""
+    with _lock:
+        return dict(_stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YouTube字幕ストアの管理")
+    parser.add_argument("--path", help="ストアのパス（省略時は既定のパス）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    clear = subparsers.add_parser("clear-search", help="検索キャッシュを削除")
+    clear.add_argument("--keyword", help="このキーワードだけ削除")
+    
+    args = parser.parse_args()
+    if args.path:
+        configure({"path": args.path})
+    
+    if args.command == "clear-search":
+        removed = clear_search(args.keyword)
+        print(f"🗑️  検索キャッシュを削除しました: {removed}件 ({store_path()})")
+
+
+if __name__ == "__main__":
+    main()
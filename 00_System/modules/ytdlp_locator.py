@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+yt-dlpの実行ファイル探索
+見つけたパスとバージョンをプロセス内とディスクにキャッシュし、
+実行ファイルのmtimeが変わらない限り `--version` の起動を省く
+"""
+
+from pathlib import Path
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+
+# 探す順番（PATH上のものはshutil.whichで絶対パスにする）
+YTDLP_PATHS = [
+    "/Users/keigo/Library/Python/3.12/bin/yt-dlp",
+    "/usr/local/bin/yt-dlp",
+    "yt-dlp",
+]
+
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "brain_content_system" / "ytdlp.json"
+
+_found = None
+_lock = threading.Lock()
+
+
+def _resolve(path):
+    """候補を絶対パスにする（存在しなければNone）"""
+    if os.path.isabs(path):
+        return path if os.path.isfile(path) else None
+    return shutil.which(path)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _load_disk_cache(cache_file):
+    """ディスクのキャッシュが使えれば (path, version) を返す"""
+    try:
+        entry = json.loads(Path(cache_file).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    path = entry.get("path")
+    # 更新・削除された実行ファイルは探し直す
+    if not path or _mtime(path) is None or _mtime(path) != entry.get("mtime"):
+        return None
+    return path, entry.get("version", "")
+
+
+def _save_disk_cache(cache_file, path, version):
+    try:
+        cache_file = Path(cache_file)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"path": path, "version": version, "mtime": _mtime(path)}), encoding="utf-8")
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+
+
+def _probe(candidates):
+    """候補を順に `--version` で確認"""
+    for candidate in candidates:
+        path = _resolve(candidate)
+        if not path:
+            continue
+        try:
+            result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            continue
+        if result.returncode == 0:
+            return path, result.stdout.strip()
+    return None
+
+
+def find_ytdlp(candidates=None, cache_file=DEFAULT_CACHE_FILE):
+    """
+    yt-dlpの実行ファイルを探す
+
+    Returns:
+        (path, version)。見つからなければ (None, None)
+    """
+    global _found
+    with _lock:
+        if _found is None:
+            _found = _load_disk_cache(cache_file) if cache_file else None
+            if _found is None:
+                # 見つからなかった場合もこのプロセスでは探し直さない
+                _found = _probe(candidates or YTDLP_PATHS) or (None, None)
+                if _found[0] and cache_file:
+                    _save_disk_cache(cache_file, *_found)
+        return _found
+
+
+def reset():
+    """プロセス内キャッシュを破棄（見つからなかった結果も含む）"""
+    global _found
+    with _lock:
+        _found = None
@@ -8,7 +8,8 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from modules.phase4_writing import load_api_keys, generate_image_with_gemini
+from modules import credentials
+from modules.phase4_writing import generate_image_with_gemini
 from google import genai
 
 def main():
@@ -18,7 +19,7 @@ def main():
     
     # APIキー読み込み
     print("\n1. APIキー読み込み...")
-    claude_key, gemini_key = load_api_keys()
+    gemini_key = credentials.get_gemini_api_key()
     
     if not gemini_key:
         print("  ❌ Gemini APIキーが見つかりません")